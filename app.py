@@ -1,7 +1,9 @@
+import time
+BOOT_STARTED = time.monotonic()  # Before the heavier imports below, for time-to-first-response
+
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
-import pandas as pd
 import datetime
 from dotenv import load_dotenv
 from models.models import Media, Entry
@@ -108,6 +110,20 @@ def bad_request_error(error):
 logger.info("Registering API blueprint")
 app.register_blueprint(api)
 
+logger.info(f"App ready in {(time.monotonic() - BOOT_STARTED) * 1000:.0f} ms")
+
+# 5. Measure cold starts: log how long after boot the first response went out
+_first_response_logged = False
+
+@app.after_request
+def log_first_response(response):
+    global _first_response_logged
+    if not _first_response_logged:
+        _first_response_logged = True
+        logger.info(f"Time to first response: {(time.monotonic() - BOOT_STARTED) * 1000:.0f} ms "
+                    f"({request.method} {request.path} -> {response.status_code})")
+    return response
+
 # 6. Run the app (only if this file is run directly)
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))  # Default to 5000 to match fly.io expectations
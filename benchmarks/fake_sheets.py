@@ -0,0 +1,239 @@
+"""In-memory stand-in for the Google Sheets values API, for benchmarks and offline runs.
+
+FakeSheets.values() returns an object with the same get/batchGet/append/
+update/batchUpdate methods as the discovery-built
+spreadsheets().values() resource, so GoogleSheetsManager runs unchanged on
+top of it (see install()). Every call can be slowed down (latency and
+jitter) or made to fail (error_rate, fail_next) to see how the service
+behaves when Sheets is slow or throttling.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+MEDIA_HEADERS = ['id', 'order', 'media_name', 'media_path', 'text', 'linkie', 'is_horizontal']
+ENTRY_HEADERS = ['id', 'media_id', 'entry_text']
+
+_CELL = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def column_index(letters: str) -> int:
+    """Convert A1 column letters to a 0-based index ('A' -> 0, 'AA' -> 26)"""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def column_letters(index: int) -> str:
+    """Convert a 0-based column index to A1 letters (0 -> 'A')"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def parse_a1(range_name: str) -> Tuple[str, Optional[int], Optional[int], Optional[int], Optional[int]]:
+    """Split an A1 range into (sheet, first column, first row, last column, last row).
+
+    Columns are 0-based and rows 1-based; None means unbounded
+    ('media!A2:A' -> ('media', 0, 2, 0, None), 'media!1:1' -> ('media', None, 1, None, 1)).
+    """
+    sheet, _, cells = range_name.partition('!')
+    sheet = sheet.strip("'")
+    if not cells:
+        return sheet, None, None, None, None
+    start, _, end = cells.partition(':')
+    end = end or start
+    parsed = []
+    for cell in (start, end):
+        match = _CELL.match(cell)
+        if match is None:
+            raise ValueError(f"Unsupported A1 range: {range_name}")
+        letters, digits = match.groups()
+        parsed.append((column_index(letters) if letters else None, int(digits) if digits else None))
+    (first_col, first_row), (last_col, last_row) = parsed
+    return sheet, first_col, first_row, last_col, last_row
+
+
+def make_dataset(entries: int, cards: Optional[int] = None, seed: int = 0) -> Dict[str, List[List[str]]]:
+    """Build 'media' and 'entries' sheets with the given number of entry rows.
+
+    cards defaults to one card per 50 entries (at least 1, at most 200);
+    entries are spread over the cards unevenly, as real birthday cards are.
+    """
+    rng = random.Random(seed)
+    if cards is None:
+        cards = min(200, max(1, entries // 50))
+    media = [list(MEDIA_HEADERS)]
+    for i in range(cards):
+        media.append([
+            f'c{i:05d}', str(rng.randint(1, cards)), f'Card {i}', f'card_{i:05d}.jpg',
+            f'Text of card {i}', f'https://example.com/{i}', rng.choice(['1', '0', 'TRUE', 'FALSE'])
+        ])
+    card_ids = [row[0] for row in media[1:]]
+    weights = [rng.paretovariate(1.5) for _ in card_ids]
+    rows = [list(ENTRY_HEADERS)]
+    for i, media_id in enumerate(rng.choices(card_ids, weights=weights, k=entries)):
+        words = ' '.join(rng.choice(['happy', 'birthday', 'see', 'you', 'soon', 'love', 'cake', 'party'])
+                         for _ in range(rng.randint(3, 30)))
+        rows.append([f'e{i:07d}', media_id, words])
+    return {'media': media, 'entries': rows}
+
+
+class FakeRequest:
+    """A pending call, run by execute() like an HttpRequest from the real client"""
+
+    def __init__(self, sheets: 'FakeSheets', method: str, method_id: str, call: Callable[[], Dict[str, Any]]):
+        self.method = method
+        self.methodId = method_id
+        self._sheets = sheets
+        self._call = call
+
+    def execute(self, http=None, num_retries: int = 0) -> Dict[str, Any]:
+        return self._sheets._run(self.methodId, self._call)
+
+
+class FakeValues:
+    """The spreadsheets().values() resource of a FakeSheets"""
+
+    def __init__(self, sheets: 'FakeSheets'):
+        self._sheets = sheets
+
+    def get(self, spreadsheetId: str, range: str, **kwargs) -> FakeRequest:
+        return FakeRequest(self._sheets, 'GET', 'sheets.spreadsheets.values.get',
+                           lambda: self._sheets._read(range))
+
+    def batchGet(self, spreadsheetId: str, ranges: List[str], **kwargs) -> FakeRequest:
+        return FakeRequest(self._sheets, 'GET', 'sheets.spreadsheets.values.batchGet',
+                           lambda: {'spreadsheetId': spreadsheetId,
+                                    'valueRanges': [self._sheets._read(r) for r in ranges]})
+
+    def append(self, spreadsheetId: str, range: str, body: Dict[str, Any], **kwargs) -> FakeRequest:
+        return FakeRequest(self._sheets, 'POST', 'sheets.spreadsheets.values.append',
+                           lambda: {'spreadsheetId': spreadsheetId,
+                                    'updates': self._sheets._append(range, body.get('values', []))})
+
+    def update(self, spreadsheetId: str, range: str, body: Dict[str, Any], **kwargs) -> FakeRequest:
+        return FakeRequest(self._sheets, 'PUT', 'sheets.spreadsheets.values.update',
+                           lambda: self._sheets._write(range, body.get('values', [])))
+
+    def batchUpdate(self, spreadsheetId: str, body: Dict[str, Any], **kwargs) -> FakeRequest:
+        def call():
+            responses = [self._sheets._write(item['range'], item.get('values', [])) for item in body.get('data', [])]
+            return {'spreadsheetId': spreadsheetId, 'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+                    'responses': responses}
+        return FakeRequest(self._sheets, 'POST', 'sheets.spreadsheets.values.batchUpdate', call)
+
+
+class FakeSheets:
+    """A spreadsheet held in memory: sheet name -> rows of string cells.
+
+    latency (plus up to jitter more) seconds are slept on every call, and
+    error_rate of the calls fail with error_status, like Sheets does under
+    load. fail_next() queues failures for the next calls. calls counts the
+    calls made per method.
+    """
+
+    def __init__(self, data: Optional[Dict[str, List[List[Any]]]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 429, seed: int = 0):
+        self.sheets: Dict[str, List[List[str]]] = {
+            name: [[str(cell) for cell in row] for row in rows] for name, rows in (data or {}).items()
+        }
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls: Counter = Counter()
+        self._failures: List[int] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def values(self) -> FakeValues:
+        return FakeValues(self)
+
+    def fail_next(self, count: int = 1, status: int = 503) -> None:
+        """Make the next count calls fail with status"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _run(self, method_id: str, call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            self.calls[method_id.rsplit('.', 1)[-1]] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            status = self._failures.pop(0) if self._failures else None
+            if status is None and self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            raise HttpError(httplib2.Response({'status': status}), b'{"error": "injected by FakeSheets"}')
+        with self._lock:
+            return call()
+
+    def _bounds(self, range_name: str) -> Tuple[List[List[str]], str, int, int, int, int]:
+        sheet, first_col, first_row, last_col, last_row = parse_a1(range_name)
+        if sheet not in self.sheets:
+            raise HttpError(httplib2.Response({'status': 400}), f'Unable to parse range: {range_name}'.encode())
+        rows = self.sheets[sheet]
+        if last_col is None:
+            last_col = max((len(row) for row in rows), default=0) - 1
+        return (rows, sheet, first_col or 0, first_row or 1, last_col,
+                len(rows) if last_row is None else last_row)
+
+    def _read(self, range_name: str) -> Dict[str, Any]:
+        rows, sheet, first_col, first_row, last_col, last_row = self._bounds(range_name)
+        values = []
+        for row in rows[first_row - 1:last_row]:
+            cells = row[first_col:last_col + 1]
+            # Like Sheets, trailing empty cells and rows are left out
+            while cells and cells[-1] == '':
+                cells = cells[:-1]
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        result = {'range': f'{sheet}!{column_letters(first_col)}{first_row}:{column_letters(last_col)}{last_row}',
+                  'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def _write(self, range_name: str, values: List[List[Any]]) -> Dict[str, Any]:
+        rows, sheet, first_col, first_row, _, _ = self._bounds(range_name)
+        for offset, new_row in enumerate(values):
+            index = first_row - 1 + offset
+            while len(rows) <= index:
+                rows.append([])
+            row = rows[index]
+            if len(row) < first_col + len(new_row):
+                row.extend([''] * (first_col + len(new_row) - len(row)))
+            row[first_col:first_col + len(new_row)] = [str(cell) for cell in new_row]
+        width = max((len(row) for row in values), default=0)
+        return {'updatedRange': f'{sheet}!{column_letters(first_col)}{first_row}:'
+                                f'{column_letters(first_col + max(width, 1) - 1)}{first_row + len(values) - 1}',
+                'updatedRows': len(values), 'updatedColumns': width,
+                'updatedCells': sum(len(row) for row in values)}
+
+    def _append(self, range_name: str, values: List[List[Any]]) -> Dict[str, Any]:
+        rows, sheet, first_col, _, _, _ = self._bounds(range_name)
+        # New rows go right after the last non-empty one
+        last = len(rows)
+        while last and not any(rows[last - 1]):
+            last -= 1
+        del rows[last:]
+        return self._write(f'{sheet}!{column_letters(first_col)}{last + 1}', values)
+
+
+def install(manager, sheets: FakeSheets) -> None:
+    """Point a GoogleSheetsManager at sheets instead of the Sheets API (no credentials needed)"""
+    manager._values_resource = sheets.values()
+    manager._new_http = lambda: None
+    manager.spreadsheet_id = manager.spreadsheet_id or 'fake-spreadsheet'
@@ -0,0 +1,372 @@
+"""Benchmark the API and DataManager against an in-memory Sheets (benchmarks.fake_sheets).
+
+    python -m benchmarks.run --entries 10,1000,100000 --save benchmarks/baseline.json
+    python -m benchmarks.run --entries 10,1000,100000 --compare benchmarks/baseline.json
+
+Each dataset size runs in its own process and scratch directory, so caches,
+snapshots and queued entries never leak between runs. Every scenario
+reports p50/p99 latency, throughput, the largest allocation peak of a
+single call (tracemalloc), the process's max RSS and how many Sheets calls
+the timed calls made. With --compare, p50 or p99 more than --threshold slower than the
+baseline is reported as a regression and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Defaults for the app under test; anything already set in the environment wins
+BENCH_ENV = {
+    'FAST_START': 'false',
+    'GOOGLE_SHEETS_SPREADSHEET_ID': 'fake-spreadsheet',
+    # The fake has no quota; keep the scheduler out of the measurements
+    'SHEETS_READS_PER_MINUTE': '1000000000',
+    'SHEETS_WRITES_PER_MINUTE': '1000000000',
+    'SHEETS_BURST': '1000000',
+    'METRICS_FLUSH_INTERVAL': '3600',
+    'PROFILE_SAMPLE_RATE': '0',
+    # Entries are flushed by the scenario that measures it, not in the background
+    'ENTRY_FLUSH_INTERVAL': '3600',
+}
+
+# Calls run under tracemalloc per scenario (it slows everything down, so
+# memory is measured separately from latency)
+MEMORY_SAMPLES = 20
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of samples (fraction in 0..1)"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(call: Callable[[], Any], requests: int, concurrency: int = 1, warmup: int = 5,
+            before_each: Optional[Callable[[], Any]] = None,
+            sheets_calls: Optional[Counter] = None) -> Dict[str, float]:
+    """Time requests calls of call() spread over concurrency threads.
+
+    before_each runs untimed before every call (used to expire caches), and
+    forces a single thread so it can't expire another thread's call.
+    sheets_calls (the fake's call counter) is counted over the timed calls only.
+    """
+    if before_each is not None:
+        concurrency = 1
+    for _ in range(warmup):
+        if before_each is not None:
+            before_each()
+        call()
+
+    if sheets_calls is not None:
+        sheets_calls.clear()
+    latencies: List[float] = []
+    errors = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            if before_each is not None:
+                before_each()
+            started = time.perf_counter()
+            try:
+                call()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    calls = sum(sheets_calls.values()) if sheets_calls is not None else 0
+
+    # Largest transient allocation of a single call
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(min(requests, MEMORY_SAMPLES)):
+            if before_each is not None:
+                before_each()
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                call()
+            except Exception:
+                pass
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'peak_alloc_kib': peak / 1024,
+        'max_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'sheets_calls': calls,
+    }
+
+
+def run_dataset(entries: int, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    """Benchmark every scenario against a fresh app on a dataset of `entries` entries"""
+    # The app keeps its files under ./data, so give it a scratch directory
+    scratch = tempfile.TemporaryDirectory(prefix='isee-bench-')
+    os.chdir(scratch.name)
+    try:
+        return run_scenarios(entries, args)
+    finally:
+        os.chdir(ROOT)
+        try:
+            scratch.cleanup()
+        except OSError:
+            pass  # A background thread of the app was still writing there
+
+
+def run_scenarios(entries: int, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    sys.path.insert(0, ROOT)
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+
+    from benchmarks.fake_sheets import FakeSheets, install, make_dataset
+    from database.data_manager import DataManager
+    from database.sheets_manager import GoogleSheetsManager
+    from database.storage import SheetsStorage
+
+    sheets = FakeSheets(make_dataset(entries, args.cards, seed=args.seed), latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+
+    from app import app
+    from routes import api_routes
+    install(api_routes.sheets_manager, sheets)
+    api_manager = api_routes.sheets_manager
+
+    manager = GoogleSheetsManager()
+    install(manager, sheets)
+    data_manager = DataManager(backend=SheetsStorage(manager))
+
+    card_ids = [row[0] for row in sheets.sheets['media'][1:]]
+    rng = random.Random(args.seed)
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def get(path: str) -> Callable[[], None]:
+        def call():
+            response = client().get(path, headers={'Accept-Encoding': 'gzip'})
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} -> {response.status_code}")
+        return call
+
+    def create_entry():
+        response = client().post('/api/createentry', json={'media_id': rng.choice(card_ids),
+                                                           'entry_text': 'benchmark entry'})
+        if response.status_code != 201:
+            raise RuntimeError(f"POST /api/createentry -> {response.status_code}")
+
+    def create_and_flush_entry():
+        # The whole write path: accepted, then appended to the sheet
+        create_entry()
+        api_routes.entry_queue.flush()
+
+    def expire_api_cache():
+        for sheet_name in ('media', 'entries'):
+            api_manager.invalidate_range(sheet_name)
+
+    def expire_manager_cache():
+        for sheet_name in ('media', 'entries'):
+            manager.invalidate_range(sheet_name)
+
+    # Reads first: the write scenarios grow the entries sheet
+    scenarios = [
+        ('GET /api/cards', get('/api/cards'), None),
+        ('GET /api/cards (cache expired)', get('/api/cards'), expire_api_cache),
+        ('GET /api/story-view', get('/api/story-view'), None),
+        ('GET /api/story-view (cache expired)', get('/api/story-view'), expire_api_cache),
+        ('GET /api/story-view?limit=20', get('/api/story-view?limit=20'), None),
+        ('GET /api/cards/<id>/entries', get(f'/api/cards/{card_ids[0]}/entries'), None),
+        ('DataManager.get_media_data', data_manager.get_media_data, None),
+        ('DataManager.get_entries_data', data_manager.get_entries_data, None),
+        ('DataManager.get_story_data', data_manager.get_story_data, None),
+        ('DataManager.get_entry_records', data_manager.get_entry_records, None),
+        ('DataManager.get_story_data (cache expired)', data_manager.get_story_data, expire_manager_cache),
+        ('DataManager.update_media_data',
+         lambda: data_manager.update_media_data(rng.choice(card_ids), {'text': f'edited {rng.random()}'}), None),
+        ('DataManager.append_entry',
+         lambda: data_manager.append_entry({'media_id': rng.choice(card_ids), 'entry_text': 'benchmark entry'}),
+         None),
+        ('POST /api/createentry', create_entry, None),
+        ('POST /api/createentry + flush', create_and_flush_entry, None),
+    ]
+
+    results = {}
+    for name, call, before_each in scenarios:
+        if args.only and not any(part in name for part in args.only):
+            continue
+        results[name] = measure(call, args.requests, args.concurrency, args.warmup, before_each, sheets.calls)
+    return results
+
+
+def run_in_subprocess(entries: int, argv: List[str]) -> Dict[str, Dict[str, float]]:
+    """Run one dataset size in a fresh interpreter and return its results"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        results_path = f.name
+    try:
+        command = [sys.executable, '-m', 'benchmarks.run', *argv, '--entries', str(entries),
+                   '--results-file', results_path]
+        completed = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if completed.returncode != 0:
+            output = completed.stdout.decode(errors='replace')
+            raise RuntimeError(f"Benchmark for {entries} entries failed:\n{output[-4000:]}")
+        with open(results_path, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(results_path)
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+            threshold: float, min_delta_ms: float = 0.0) -> List[str]:
+    """Return a line per scenario whose p50 or p99 is more than threshold (and min_delta_ms) slower than baseline"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, current in scenarios.items():
+            base = baseline.get('results', {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            for key in ('p50_ms', 'p99_ms'):
+                slower = current[key] - base[key]
+                if base[key] and slower > base[key] * threshold and slower > min_delta_ms:
+                    regressions.append(f"{size} entries, {name}: {key} {base[key]:.2f} -> {current[key]:.2f} "
+                                       f"({change(current[key], base[key])})")
+    return regressions
+
+
+def change(current: float, base: float) -> str:
+    return f'{(current / base - 1) * 100:+.0f}%' if base else 'n/a'
+
+
+def report(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Optional[Dict[str, Any]]) -> None:
+    for size, scenarios in results.items():
+        print(f"\n{size} entries")
+        header = f"{'scenario':<44} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KiB':>9} {'RSS MiB':>8} {'calls':>6}"
+        if baseline is not None:
+            header += f" {'p50 vs base':>11} {'p99 vs base':>11}"
+        print(header)
+        for name, r in scenarios.items():
+            line = (f"{name:<44} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['throughput_rps']:>9.1f} "
+                    f"{r['peak_alloc_kib']:>9.0f} {r['max_rss_mib']:>8.0f} {r['sheets_calls']:>6}")
+            if r['errors']:
+                line += f"  ({r['errors']} errors)"
+            if baseline is not None:
+                base = baseline.get('results', {}).get(size, {}).get(name)
+                if base is not None:
+                    line += f" {change(r['p50_ms'], base['p50_ms']):>11} {change(r['p99_ms'], base['p99_ms']):>11}"
+            print(line)
+
+
+def main():
+    """Command-line entry point for the benchmark suite"""
+    parser = argparse.ArgumentParser(description='Benchmark the API and DataManager against a fake Sheets')
+    parser.add_argument('--entries', default='10,1000,10000',
+                        help='Comma-separated dataset sizes (number of entries)')
+    parser.add_argument('--cards', type=int, help='Cards per dataset (default: one per 50 entries, max 200)')
+    parser.add_argument('--requests', type=int, default=200, help='Timed calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Threads issuing calls')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed calls before each scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every Sheets call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many more seconds per call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of Sheets calls failing with 429')
+    parser.add_argument('--only', action='append', help='Run scenarios whose name contains this (repeatable)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='Write the results to this baseline file')
+    parser.add_argument('--compare', help='Compare against this baseline file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Slowdown of p50/p99 reported as a regression (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='Ignore slowdowns smaller than this (sub-millisecond timings are noisy)')
+    parser.add_argument('--results-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.entries.split(',') if size.strip()]
+
+    if args.results_file:
+        # Child process: one dataset size
+        results = run_dataset(sizes[0], args)
+        with open(args.results_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+        return
+
+    # Forward everything but the sizes and the baseline options to each child
+    argv = []
+    for key in ('cards', 'requests', 'concurrency', 'warmup', 'latency', 'jitter', 'error_rate', 'seed'):
+        value = getattr(args, key)
+        if value is not None:
+            argv += [f"--{key.replace('_', '-')}", str(value)]
+    for only in args.only or []:
+        argv += ['--only', only]
+
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} entries...", file=sys.stderr)
+        results[str(size)] = run_in_subprocess(size, argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'settings': {key: getattr(args, key) for key in
+                             ('cards', 'requests', 'concurrency', 'latency', 'jitter', 'error_rate', 'seed')},
+                'results': results,
+            }, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,73 @@
-import pandas as pd
-from typing import List, Dict, Any, Optional
-from .sheets_manager import GoogleSheetsManager
 import os
+from typing import List, Dict, Any, Optional, Union
+from models.models import Media, Entry
+from .storage import StorageBackend, SheetsStorage, CsvStorage
+
+# Backend used when none is given in code: 'sheets', 'csv' or 'sqlite'
+# (SQLiteStorage reads its file from SQLITE_PATH)
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'sheets')
 
 class DataManager:
-    def __init__(self, use_sheets: bool = True):
-        self.use_sheets = use_sheets
-        if use_sheets:
-            self.sheets_manager = GoogleSheetsManager()
-        
+    def __init__(self, use_sheets: Optional[bool] = None, backend: Optional[Union[str, StorageBackend]] = None):
+        # backend is a StorageBackend or one of 'sheets', 'csv' and 'sqlite';
+        # without one, use_sheets picks between Sheets and CSV, and without
+        # that DATA_BACKEND decides
+        if backend is None:
+            if use_sheets is None:
+                backend = DATA_BACKEND
+            else:
+                backend = 'sheets' if use_sheets else 'csv'
+        if isinstance(backend, str):
+            backend = self.create_backend(backend)
+        self.backend = backend
+        self.use_sheets = isinstance(backend, SheetsStorage)
+        if self.use_sheets:
+            self.sheets_manager = backend.sheets_manager
+
+    @staticmethod
+    def create_backend(name: str) -> StorageBackend:
+        """Build a storage backend by name"""
+        if name == 'sheets':
+            return SheetsStorage()
+        elif name == 'csv':
+            return CsvStorage()
+        elif name == 'sqlite':
+            from .sqlite_storage import SQLiteStorage
+            return SQLiteStorage()
+        raise ValueError(f"Unknown storage backend: {name}")
+
     def get_media_data(self) -> List[Dict[str, Any]]:
         """Get all media data"""
-        if self.use_sheets:
-            return self.sheets_manager.read_sheet('media!A1:F')  # Using 'media' sheet
-        else:
-            df = pd.read_csv('data/media.csv')
-            return df.to_dict('records')
-            
+        return self.backend.get_media()
+
     def get_entries_data(self) -> List[Dict[str, Any]]:
         """Get all entries data"""
-        if self.use_sheets:
-            return self.sheets_manager.read_sheet('entries!A1:C')  # Using 'entries' sheet
-        else:
-            df = pd.read_csv('data/entries.csv')
-            return df.to_dict('records')
-            
+        return self.backend.get_entries()
+
+    def get_story_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get media and entries data together ({'media': [...], 'entries': [...]})"""
+        return self.backend.get_story_data()
+
+    def get_media_records(self) -> List[Media]:
+        """Get all media as typed records (read-only: they may be shared with a cache)"""
+        return self.backend.get_media_records()
+
+    def get_entry_records(self) -> List[Entry]:
+        """Get all entries as typed records (read-only: they may be shared with a cache)"""
+        return self.backend.get_entry_records()
+
     def update_media_data(self, media_id: int, updates: Dict[str, Any]) -> bool:
         """Update specific media entry"""
-        if self.use_sheets:
-            # First get current data
-            data = self.sheets_manager.read_sheet('media!A1:F')
-            # Find the row to update
-            row_idx = None
-            for idx, row in enumerate(data):
-                if str(row.get('id')) == str(media_id):
-                    row_idx = idx + 2  # +2 because sheets is 1-indexed and we have header
-                    break
-                    
-            if row_idx is None:
-                return False
-                
-            # Update the row
-            range_name = f'media!A{row_idx}:F{row_idx}'
-            values = [[
-                updates.get('id', data[row_idx-2].get('id')),
-                updates.get('order', data[row_idx-2].get('order')),
-                updates.get('media_name', data[row_idx-2].get('media_name')),
-                updates.get('media_path', data[row_idx-2].get('media_path')),
-                updates.get('text', data[row_idx-2].get('text')),
-                updates.get('linkie', data[row_idx-2].get('linkie'))
-            ]]
-            return self.sheets_manager.update_sheet(range_name, values)
-        else:
-            df = pd.read_csv('data/media.csv')
-            mask = df['id'] == media_id
-            if not mask.any():
-                return False
-            for key, value in updates.items():
-                df.loc[mask, key] = value
-            df.to_csv('data/media.csv', index=False)
-            return True
-            
+        return self.backend.update_media(media_id, updates)
+
+    def update_media_many(self, updates: Dict[Any, Dict[str, Any]]) -> Dict[Any, bool]:
+        """Update several media entries at once ({media_id: updates}), returning {media_id: found}"""
+        return self.backend.update_media_many(updates)
+
     def append_media(self, media_data: Dict[str, Any]) -> bool:
         """Add new media entry"""
-        if self.use_sheets:
-            values = [
-                media_data.get('id', ''),
-                media_data.get('order', ''),
-                media_data.get('media_name', ''),
-                media_data.get('media_path', ''),
-                media_data.get('text', ''),
-                media_data.get('linkie', '')
-            ]
-            return self.sheets_manager.append_row('media!A:F', values)
-        else:
-            df = pd.read_csv('data/media.csv')
-            df = df.append(media_data, ignore_index=True)
-            df.to_csv('data/media.csv', index=False)
-            return True
-            
+        return self.backend.append_media(media_data)
+
     def append_entry(self, entry_data: Dict[str, Any]) -> bool:
         """Add new entry"""
-        if self.use_sheets:
-            values = [
-                entry_data.get('media_id', ''),
-                entry_data.get('entry_text', ''),
-                entry_data.get('timestamp', '')
-            ]
-            return self.sheets_manager.append_row('entries!A:C', values)
-        else:
-            df = pd.read_csv('data/entries.csv')
-            df = df.append(entry_data, ignore_index=True)
-            df.to_csv('data/entries.csv', index=False)
-            return True 
\ No newline at end of file
+        return self.backend.append_entry(entry_data)
@@ -0,0 +1,255 @@
+import atexit
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from googleapiclient.errors import HttpError
+from models.models import Entry, RecordRows
+from services.cooperative import run_blocking
+from .sheets_manager import GoogleSheetsManager, SheetSnapshot, ENTRIES_RANGE
+
+# Where accepted-but-unflushed entries are logged, one file per process.
+# Must be on storage that outlives the machine (a volume in production),
+# since /createentry answers before the entry reaches the sheet
+PENDING_ENTRIES_DIR = os.getenv('PENDING_ENTRIES_DIR', os.path.join('data', 'pending_entries'))
+
+# Flusher tuning (seconds / rows per append call)
+ENTRY_FLUSH_INTERVAL = float(os.getenv('ENTRY_FLUSH_INTERVAL', '2'))
+ENTRY_FLUSH_BATCH_SIZE = int(os.getenv('ENTRY_FLUSH_BATCH_SIZE', '200'))
+ENTRY_FLUSH_MAX_BACKOFF = float(os.getenv('ENTRY_FLUSH_MAX_BACKOFF', '60'))
+
+# Column order of the rows create_entry appends to the entries sheet
+ENTRY_COLUMNS = ['id', 'media_id', 'entry_text']
+
+logger = logging.getLogger(__name__)
+
+
+class EntryQueue:
+    """Write-behind queue for new entries.
+
+    submit() makes an entry durable in a local append-only log and returns; a
+    background thread pushes pending rows to the entries sheet in batched
+    appends. Each process owns (and flocks) its own log file, so logs left
+    behind by a crashed worker are picked up and replayed by the next one
+    that starts.
+    """
+
+    def __init__(self, sheets_manager: GoogleSheetsManager,
+                 range_name: str = 'entries!A:C', log_dir: str = PENDING_ENTRIES_DIR):
+        self.sheets_manager = sheets_manager
+        self.range_name = range_name
+        self.log_dir = log_dir
+        self._pending: List[List[Any]] = []
+        # Rows recovered from another process's log may already be in the
+        # sheet if that process died between appending and logging it
+        self._unverified_ids: set = set()
+        self._revision = 0
+        self._changed_at = 0.0
+        self._log = None
+        self._log_pid: Optional[int] = None
+        self._flush_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._overlay_cache: Dict[str, Any] = {}
+
+    def submit(self, row: List[Any]) -> None:
+        """Durably accept an entry row ([id, media_id, entry_text]) for a later flush"""
+        with self._cond:
+            self._ensure_started()
+            self._write_log({'op': 'add', 'row': row})
+            self._pending.append(row)
+            self._revision += 1
+            self._changed_at = time.time()
+            self._cond.notify()
+
+    def pending(self) -> List[List[Any]]:
+        """Rows accepted but not yet written to the sheet, oldest first"""
+        with self._cond:
+            return list(self._pending)
+
+    def overlay(self, snapshot: SheetSnapshot) -> SheetSnapshot:
+        """Return snapshot with pending entries appended to its entries rows (and records)"""
+        with self._cond:
+            pending = list(self._pending)
+            revision = self._revision
+            changed_at = self._changed_at
+        if not pending or ENTRIES_RANGE not in snapshot.data:
+            return snapshot
+
+        entries = snapshot.data[ENTRIES_RANGE]
+        known_ids = self._overlay_cache.get(snapshot.version)
+        if known_ids is None:
+            # Computed once per snapshot; a just-flushed row may show up in both
+            if ENTRIES_RANGE in snapshot.records:
+                known_ids = {entry.id for entry in snapshot.records[ENTRIES_RANGE]}
+            else:
+                known_ids = {entry.get('id') for entry in entries}
+            self._overlay_cache = {snapshot.version: known_ids}
+
+        extra = [dict(zip(ENTRY_COLUMNS, row)) for row in pending if row[0] not in known_ids]
+        if not extra:
+            return snapshot
+        data = dict(snapshot.data)
+        data[ENTRIES_RANGE] = entries + extra
+        records = dict(snapshot.records)
+        if isinstance(data[ENTRIES_RANGE], RecordRows):
+            records[ENTRIES_RANGE] = data[ENTRIES_RANGE].records  # The rows are these records
+        elif ENTRIES_RANGE in records:
+            records[ENTRIES_RANGE] = records[ENTRIES_RANGE] + [Entry.from_row(row) for row in extra]
+        version = hashlib.sha1(f'{snapshot.version};pending={revision}'.encode()).hexdigest()
+        return SheetSnapshot(
+            data=data,
+            version=version,
+            last_modified=max(snapshot.last_modified, changed_at),
+            records=records
+        )
+
+    def flush(self) -> int:
+        """Push up to one batch of pending rows to the sheet, returning how many were flushed"""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._pending[:ENTRY_FLUSH_BATCH_SIZE]
+                unverified = self._unverified_ids & {row[0] for row in batch}
+            if not batch:
+                return 0
+
+            to_send = batch
+            if unverified:
+                self.sheets_manager.invalidate_range(ENTRIES_RANGE)
+                present = {entry.id for entry in self.sheets_manager.read_records(ENTRIES_RANGE)}
+                written = unverified & present
+                if written:
+                    logger.info(f"Skipping {len(written)} recovered entries already in the sheet")
+                    to_send = [row for row in batch if row[0] not in written]
+
+            if to_send:
+                try:
+                    self.sheets_manager.append_rows(self.range_name, to_send)
+                except Exception as e:
+                    # Only a 429 guarantees nothing was written (a timeout or
+                    # reset may come after Sheets appended the rows), so check
+                    # the sheet before sending these again
+                    if not (isinstance(e, HttpError) and e.resp.status == 429):
+                        with self._cond:
+                            self._unverified_ids.update(row[0] for row in to_send)
+                    raise
+
+            with self._cond:
+                flushed_ids = [row[0] for row in batch]
+                del self._pending[:len(batch)]
+                self._unverified_ids.difference_update(flushed_ids)
+                self._revision += 1
+                self._write_log({'op': 'done', 'ids': flushed_ids})
+                if not self._pending:
+                    self._compact_log()
+            return len(batch)
+
+    def start(self) -> None:
+        """Recover orphaned logs and start the background flusher (idempotent)"""
+        with self._cond:
+            self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        # Caller holds self._cond
+        if self._log is not None and self._log_pid == os.getpid():
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._log_pid = os.getpid()
+        log_path = os.path.join(self.log_dir, f'{self._log_pid}.log')
+        while True:
+            self._log = open(log_path, 'a+', encoding='utf-8')
+            fcntl.flock(self._log, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(self._log.fileno()), os.stat(log_path)):
+                    break
+            except FileNotFoundError:
+                pass
+            # Another worker's recovery took the file between our open and
+            # lock and removed it; entries logged to it would be lost
+            self._log.close()
+        self._pending = []
+        self._recover(log_path)
+
+        self._thread = threading.Thread(target=self._run, name='entry-queue-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _recover(self, own_path: str) -> None:
+        """Adopt pending rows from logs whose owning process is gone"""
+        # A restarted container can hand out the same pid again
+        recovered = self._replay(self._log)
+        for path in sorted(glob.glob(os.path.join(self.log_dir, '*.log'))):
+            if path == own_path:
+                continue
+            with open(path, 'r+', encoding='utf-8') as orphan:
+                try:
+                    fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Still owned by a live worker
+                rows = self._replay(orphan)
+                for row in rows:
+                    self._write_log({'op': 'add', 'row': row})
+                recovered.extend(rows)
+                os.remove(path)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} unflushed entries from previous workers")
+            self._pending.extend(recovered)
+            self._unverified_ids.update(row[0] for row in recovered)
+            self._revision += 1
+            self._changed_at = time.time()
+
+    @staticmethod
+    def _replay(log) -> List[List[Any]]:
+        """Return the rows added but never marked done in a log file"""
+        log.seek(0)
+        rows: Dict[str, List[Any]] = {}
+        for line in log:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn final write from a crash
+            if record.get('op') == 'add':
+                rows[record['row'][0]] = record['row']
+            elif record.get('op') == 'done':
+                for entry_id in record['ids']:
+                    rows.pop(entry_id, None)
+        return list(rows.values())
+
+    def _write_log(self, record: Dict[str, Any]) -> None:
+        self._log.write(json.dumps(record) + '\n')
+        self._log.flush()
+        run_blocking(os.fsync, self._log.fileno())
+
+    def _compact_log(self) -> None:
+        # Everything logged so far has been flushed, so the log can start over
+        self._log.truncate(0)
+        self._log.flush()
+        run_blocking(os.fsync, self._log.fileno())
+
+    def _run(self) -> None:
+        backoff = ENTRY_FLUSH_INTERVAL
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            # Let a burst accumulate into one batch
+            time.sleep(ENTRY_FLUSH_INTERVAL)
+            try:
+                while self.flush():
+                    pass
+                backoff = ENTRY_FLUSH_INTERVAL
+            except Exception as e:
+                logger.error(f"Error flushing entries, retrying in {backoff:.0f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, ENTRY_FLUSH_MAX_BACKOFF)
+
+    def _flush_at_exit(self) -> None:
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            logger.error(f"Could not flush entries at exit, they stay in the log: {e}")
@@ -0,0 +1,136 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'fetched_at', 'refreshing')
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refreshing = False
+
+
+class SheetCache:
+    """Read-through cache with a TTL, an LRU size bound and stale-while-revalidate.
+
+    Fresh entries (younger than ``ttl``) are served as-is. Stale entries that are
+    still inside the ``stale_ttl`` grace window are served immediately while a
+    single background thread reloads them. Anything older is reloaded inline.
+    """
+
+    def __init__(self, ttl: float = 30.0, stale_ttl: float = 300.0, max_entries: int = 64):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, _CacheEntry]' = OrderedDict()
+        # Bumped on invalidation so loads that started before a write can't
+        # put pre-write data back into the cache
+        self._generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        # Lookups served fresh / served stale (refreshing) / loaded inline
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, loading it with loader when needed"""
+        return self.get_many([key], lambda keys: {key: loader()})[key]
+
+    def get_many(self, keys: List[Hashable],
+                 loader: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """Like get() for several keys, loading every missing key with a single loader call"""
+        now = time.monotonic()
+        results: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        stale: List[Hashable] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    age = now - entry.fetched_at
+                    if age < self.ttl + self.stale_ttl:
+                        self._entries.move_to_end(key)
+                        results[key] = entry.value
+                        if age >= self.ttl:
+                            self.stale_hits += 1
+                            if not entry.refreshing:
+                                entry.refreshing = True
+                                stale.append(key)
+                        else:
+                            self.hits += 1
+                        continue
+                missing.append(key)
+            self.misses += len(missing)
+            generations = {key: self._generations.get(key, 0) for key in missing + stale}
+
+        if stale:
+            self._start_refresh(stale, loader, generations)
+        if missing:
+            loaded = loader(missing)
+            for key in missing:
+                self._store(key, loaded[key], generations[key])
+            results.update(loaded)
+        return results
+
+    def seed(self, key: Hashable, value: Any) -> None:
+        """Insert a value that is already stale, e.g. one restored from disk at boot"""
+        with self._lock:
+            self._entries[key] = _CacheEntry(value, time.monotonic() - self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Drop every key matching predicate (or all keys), returning how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            # Generations are bumped for in-flight loads of keys that aren't cached yet too
+            for key in set(keys) | set(self._generations):
+                if predicate is None or predicate(key):
+                    self._generations[key] = self._generations.get(key, 0) + 1
+            return len(keys)
+
+    def _start_refresh(self, keys: List[Hashable],
+                            loader: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                            generations: Dict[Hashable, int]) -> None:
+        thread = threading.Thread(
+            target=self._refresh,
+            args=(keys, loader, generations),
+            name=f'sheet-cache-refresh-{",".join(map(str, keys))}',
+            daemon=True
+        )
+        thread.start()
+
+    def _refresh(self, keys: List[Hashable],
+                      loader: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                      generations: Dict[Hashable, int]) -> None:
+        try:
+            loaded = loader(keys)
+        except Exception as e:
+            logger.warning(f"Background refresh of {keys} failed, keeping stale values: {e}")
+            with self._lock:
+                for key in keys:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        entry.refreshing = False
+            return
+        for key in keys:
+            self._store(key, loaded[key], generations[key])
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                # Invalidated while loading; the next reader will fetch again
+                return
+            self._entries[key] = _CacheEntry(value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
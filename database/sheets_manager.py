@@ -1,26 +1,196 @@
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import os
-from typing import List, Dict, Any, Optional
+import sys
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Sequence
 import uuid
 from dotenv import load_dotenv
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import hashlib
 import json
 import logging
+import time
+from .sheet_cache import SheetCache
+from .snapshot_store import SnapshotStore
+from .sheets_scheduler import SheetsScheduler
+from .single_flight import SingleFlight
+from services import metrics
+from models.models import RecordRows, parse_records, record_rows
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
+# Read cache tuning (seconds / number of cached ranges)
+SHEETS_CACHE_TTL = float(os.getenv('SHEETS_CACHE_TTL', '30'))
+SHEETS_CACHE_STALE_TTL = float(os.getenv('SHEETS_CACHE_STALE_TTL', '300'))
+SHEETS_CACHE_MAX_ENTRIES = int(os.getenv('SHEETS_CACHE_MAX_ENTRIES', '64'))
+
+# Socket timeout for Sheets API connections (seconds)
+SHEETS_HTTP_TIMEOUT = float(os.getenv('SHEETS_HTTP_TIMEOUT', '30'))
+# Idle keep-alive connections kept per process
+SHEETS_HTTP_POOL_SIZE = int(os.getenv('SHEETS_HTTP_POOL_SIZE', '8'))
+
+# Serve the last persisted snapshot right after boot while Sheets is re-read
+FAST_START = os.getenv('FAST_START', 'true').lower() == 'true'
+
+# Workers share fetched ranges through the snapshot files: a worker reuses
+# ranges another one fetched while they are fresh instead of fetching them too
+SHEETS_SHARED_SNAPSHOT = os.getenv('SHEETS_SHARED_SNAPSHOT', 'true').lower() == 'true'
+
+# Ranges the API serves cards and entries from
+MEDIA_RANGE = 'media!A1:G'
+ENTRIES_RANGE = 'entries!A1:C'
+CARDS_RANGE = 'media!A1:F'
+
+# Append-only ranges: after the first full read only rows past the last synced
+# one are fetched, with a full re-read every SHEETS_FULL_SYNC_INTERVAL seconds
+# to pick up rows edited, inserted or deleted by hand
+TAIL_SYNC_RANGES = [ENTRIES_RANGE] if os.getenv('SHEETS_TAIL_SYNC', 'true').lower() == 'true' else []
+SHEETS_FULL_SYNC_INTERVAL = float(os.getenv('SHEETS_FULL_SYNC_INTERVAL', '600'))
+
 logger = logging.getLogger(__name__)
 
+
+def sheet_name_of(range_name: str) -> str:
+    """Return the sheet part of an A1 range ('entries!A1:C' -> 'entries')"""
+    return range_name.split('!', 1)[0].strip("'")
+
+
+def column_letter(index: int) -> str:
+    """Convert a 0-based column index to its A1 letters (0 -> 'A', 26 -> 'AA')"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def first_row_of(range_name: str) -> Optional[int]:
+    """Return the first row number of an A1 range ('media!A15:F15' -> 15)"""
+    cell = range_name.split('!', 1)[-1].split(':', 1)[0]
+    digits = ''.join(ch for ch in cell if ch.isdigit())
+    return int(digits) if digits else None
+
+
+def tail_range(range_name: str, first_row: int) -> str:
+    """Return the part of range_name from first_row down ('entries!A1:C', 51 -> 'entries!A51:C')"""
+    sheet_name, _, cells = range_name.partition('!')
+    start, _, end = cells.partition(':')
+    start_column = start.rstrip('0123456789')
+    end_column = end.rstrip('0123456789') or start_column
+    return f'{sheet_name}!{start_column}{first_row}:{end_column}'
+
+
+def chain_version(version: str, values: List[List[Any]]) -> str:
+    """Extend a row-by-row content hash with more rows.
+
+    Hashing the header and rows all at once or in several chunks gives the same
+    version, so a tail-synced range has the same version as a full read of it.
+    """
+    for row in values:
+        version = hashlib.sha1(f'{version}{json.dumps(row, separators=(",", ":"))}'.encode()).hexdigest()
+    return version
+
+
+def _copy_rows(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # A RecordRows builds fresh dicts already
+    if isinstance(rows, RecordRows):
+        return list(rows)
+    return [dict(row) for row in rows]
+
+
+class _CountingHttp:
+    """Wraps an authorized HTTP connection to count response bytes for metrics"""
+
+    def __init__(self, http):
+        self.http = http
+        self.bytes_received = 0
+
+    def request(self, *args, **kwargs):
+        response, content = self.http.request(*args, **kwargs)
+        self.bytes_received += len(content or b'')
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+@dataclass(frozen=True)
+class SheetRange:
+    """Rows read from one range, plus a hash of their content.
+
+    Ranges of a sheet with a record type (media, entries) also carry the rows
+    as typed records, parsed once when the range is read. Where the records
+    keep every cell (entries), rows is a RecordRows built from them rather
+    than a second copy of the data.
+    """
+    rows: Sequence[Dict[str, Any]]
+    version: str
+    changed_at: float  # Unix time the content was first seen with this version
+    headers: List[str] = field(default_factory=list)
+    records: Optional[List[Any]] = None
+
+
+@dataclass(frozen=True)
+class SheetSnapshot:
+    """Rows of several ranges read together, plus a combined content version.
+
+    The rows (and records, for ranges that have them) are shared with the read
+    cache and must be treated as read-only.
+    """
+    data: Dict[str, Sequence[Dict[str, Any]]]
+    version: str
+    last_modified: float
+    records: Dict[str, List[Any]] = field(default_factory=dict)
+
+
 class GoogleSheetsManager:
-    def __init__(self):
+    def __init__(self, fast_start: bool = FAST_START):
+        # fast_start: serve the persisted snapshot while it is refreshed in the
+        # background (one-shot command-line runs turn it off and just read Sheets)
         self.creds = None
         self.spreadsheet_id = os.getenv('GOOGLE_SHEETS_SPREADSHEET_ID')
-        self.setup_credentials()
+        self.cache = SheetCache(
+            ttl=SHEETS_CACHE_TTL,
+            stale_ttl=SHEETS_CACHE_STALE_TTL,
+            max_entries=SHEETS_CACHE_MAX_ENTRIES
+        )
+        # The discovery-built client is shared; HTTP connections under it are
+        # checked out of a pool, one per call in flight (httplib2 isn't
+        # thread-safe), and never reused across processes (gunicorn forks).
+        # Not threading.local: under gevent that would be one per request
+        self._values_resource = None
+        self._values_resource_lock = threading.Lock()
+        self._http_pool: List[Any] = []
+        self._http_pool_pid: Optional[int] = None
+        self._http_pool_lock = threading.Lock()
+        # Every API call goes through the read/write quota lanes
+        self.scheduler = SheetsScheduler()
+        # Concurrent cache misses of the same range share one API call
+        self.single_flight = SingleFlight()
+        # Ranges taken from another worker's refresh vs fetched here
+        self.shared_hits = 0
+        self.shared_misses = 0
+        # range -> (version, changed_at), so a refresh with identical content
+        # doesn't move Last-Modified
+        self._changed_at: Dict[str, Any] = {}
+        # Tail-synced ranges: last synced SheetRange and when (Unix time) it was last read in full
+        self._tail_lock = threading.Lock()
+        self._tail_base: Dict[str, SheetRange] = {}
+        self._full_synced_at: Dict[str, float] = {}
+        # Last SheetRange made here per range, so records can be reused for shared rows
+        self._last_range: Dict[str, SheetRange] = {}
+        self.snapshot_store = SnapshotStore()
+        # Credentials (and the Google client libraries) are loaded on first use
+        # so importing the app stays fast on a cold machine
+        self._creds_lock = threading.Lock()
+        if fast_start:
+            self.load_snapshot()
         
     def setup_credentials(self):
         """Set up Google Sheets credentials"""
+        from google.oauth2 import service_account
         try:
             # First try environment variable
             creds_json = os.getenv('GOOGLE_CREDENTIALS')
@@ -52,45 +222,395 @@ class GoogleSheetsManager:
             logger.error(f"Error setting up credentials: {e}")
             raise
 
+    def _ensure_credentials(self):
+        if self.creds is None:
+            with self._creds_lock:
+                if self.creds is None:
+                    self.setup_credentials()
+        return self.creds
+
+    def load_snapshot(self) -> int:
+        """Seed the read cache from the persisted snapshot, returning how many ranges were loaded.
+
+        Seeded ranges count as stale: they are served at once while a background
+        refresh from Sheets runs.
+        """
+        loaded = []
+        for range_name, data in self.snapshot_store.load().items():
+            try:
+                sheet_range = self._shared_range(range_name, data)
+            except (KeyError, TypeError):
+                continue
+            self._changed_at[range_name] = (sheet_range.version, sheet_range.changed_at)
+            if range_name in TAIL_SYNC_RANGES and sheet_range.headers:
+                # Tails are fetched on top of the snapshot, but the first
+                # full sync isn't skipped since the file may be old
+                self._tail_base[range_name] = sheet_range
+            self.cache.seed(range_name, sheet_range)
+            loaded.append(range_name)
+        if loaded:
+            logger.info(f"Serving {len(loaded)} ranges from snapshot {self.snapshot_store.path} until refreshed")
+            # Reading stale entries starts their background refresh and returns at once
+            self.cache.get_many(loaded, self._load_ranges)
+        return len(loaded)
+
+    def _save_shared(self, ranges: Dict[str, SheetRange], fetch_started_at: float) -> None:
+        """Publish freshly fetched ranges to the other workers (and the next boot), in the background"""
+        data = {
+            range_name: {'rows': sheet_range.rows, 'version': sheet_range.version,
+                         'changed_at': sheet_range.changed_at, 'headers': sheet_range.headers}
+            for range_name, sheet_range in ranges.items()
+        }
+        now = time.time()
+        meta = {
+            range_name: {'version': sheet_range.version, 'fetched_at': now,
+                         'fetch_started_at': fetch_started_at,
+                         'full_synced_at': self._full_synced_at.get(range_name)}
+            for range_name, sheet_range in ranges.items()
+        }
+        self.snapshot_store.save_later(data, meta)
+
+    def _from_shared(self, ranges: List[str]) -> Dict[str, SheetRange]:
+        """Return the ranges another worker fetched recently enough (and after the last write)"""
+        data, meta = self.snapshot_store.read()
+        shared = {}
+        for range_name in ranges:
+            record, info = data.get(range_name), meta.get(range_name)
+            if record is None or info is None or record.get('version') != info.get('version'):
+                continue
+            if time.time() - info['fetched_at'] >= SHEETS_CACHE_TTL:
+                continue
+            if info['fetch_started_at'] <= self.snapshot_store.written_at(sheet_name_of(range_name)):
+                continue
+            sheet_range = self._shared_range(range_name, record)
+            # Keep one copy of the rows: drop the store's parsed file rows for ours
+            self.snapshot_store.share_rows(range_name, sheet_range.version, sheet_range.rows)
+            self._changed_at[range_name] = (sheet_range.version, sheet_range.changed_at)
+            if range_name in TAIL_SYNC_RANGES and sheet_range.headers:
+                with self._tail_lock:
+                    self._tail_base[range_name] = sheet_range
+                    if info.get('full_synced_at') is not None:
+                        self._full_synced_at[range_name] = info['full_synced_at']
+            shared[range_name] = sheet_range
+        return shared
+
+    def _shared_range(self, range_name: str, data: Dict[str, Any]) -> SheetRange:
+        """Build a SheetRange from a snapshot file record, parsing records only for rows new to this worker"""
+        rows, version, headers = data['rows'], data['version'], data.get('headers', [])
+        records = None
+        previous = self._last_range.get(range_name)
+        if previous is not None and previous.records is not None:
+            if previous.version == version:
+                rows, records = previous.rows, previous.records
+            elif (range_name in TAIL_SYNC_RANGES and headers == previous.headers
+                  and len(previous.rows) < len(rows)):
+                # Another worker synced past our copy: if it only added rows
+                # (the hash chain continues from ours), parse just those
+                new_rows = rows[len(previous.rows):]
+                if chain_version(previous.version, [list(row.values()) for row in new_rows]) == version:
+                    rows = previous.rows + new_rows
+                    if isinstance(rows, RecordRows):
+                        records = rows.records  # Parsed the new rows while adding them
+                    else:
+                        records = previous.records + parse_records(sheet_name_of(range_name), new_rows)
+        if records is None:
+            records = parse_records(sheet_name_of(range_name), rows)
+        rows = record_rows(sheet_name_of(range_name), records, headers) or rows
+        sheet_range = SheetRange(rows=rows, version=version, changed_at=data['changed_at'],
+                                 headers=headers, records=records)
+        self._last_range[range_name] = sheet_range
+        return sheet_range
+
+    def values(self):
+        """Return the long-lived spreadsheets().values() resource, building it on first use"""
+        if self._values_resource is None:
+            with self._values_resource_lock:
+                if self._values_resource is None:
+                    from googleapiclient.discovery import build
+                    # static_discovery uses the discovery document bundled with
+                    # the client library instead of fetching it over the network
+                    service = build(
+                        'sheets', 'v4',
+                        credentials=self._ensure_credentials(),
+                        static_discovery=True,
+                        cache_discovery=False
+                    )
+                    # Resources are rebuilt from the discovery document on every
+                    # access, so keep the one we use instead of the service
+                    self._values_resource = service.spreadsheets().values()
+        return self._values_resource
+
+    def _new_http(self):
+        """Open a keep-alive authorized HTTP connection"""
+        import google_auth_httplib2
+        import httplib2
+        return _CountingHttp(google_auth_httplib2.AuthorizedHttp(
+            self._ensure_credentials(),
+            http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT)
+        ))
+
+    @contextmanager
+    def _http(self) -> Iterator[Any]:
+        """Check out an idle connection from this process's pool (or open one) for one call"""
+        with self._http_pool_lock:
+            if self._http_pool_pid != os.getpid():
+                # Never reuse a socket inherited across a fork
+                self._http_pool = []
+                self._http_pool_pid = os.getpid()
+            http = self._http_pool.pop() if self._http_pool else None
+        if http is None:
+            http = self._new_http()
+        try:
+            yield http
+        finally:
+            with self._http_pool_lock:
+                if self._http_pool_pid == os.getpid() and len(self._http_pool) < SHEETS_HTTP_POOL_SIZE:
+                    self._http_pool.append(http)
+
+    def _execute(self, request, range_label: str = '') -> Dict[str, Any]:
+        """Execute a Sheets API request over a pooled connection.
+
+        Requests are rate limited and retried by the scheduler: GETs use the
+        read quota, everything else the write quota, and appends (which would
+        duplicate rows if replayed after a partial failure) are only retried
+        on 429. Calls, errors, bytes and time are recorded per method and range.
+        """
+        lane = 'read' if getattr(request, 'method', 'GET') == 'GET' else 'write'
+        method_id = getattr(request, 'methodId', '')
+        idempotent = not method_id.endswith('.append')
+        labels = {'method': method_id.rsplit('.', 1)[-1] or lane, 'range': range_label}
+        received = 0
+
+        def attempt():
+            nonlocal received
+            # A connection is only held while a request is on the wire, not
+            # while the scheduler waits for quota
+            with self._http() as http:
+                received_before = getattr(http, 'bytes_received', 0)
+                try:
+                    return request.execute(http=http)
+                finally:
+                    received += getattr(http, 'bytes_received', 0) - received_before
+
+        started = time.monotonic()
+        try:
+            return self.scheduler.run(lane, attempt, idempotent=idempotent)
+        except Exception:
+            metrics.sheets_request_errors.inc(**labels)
+            raise
+        finally:
+            metrics.sheets_requests.inc(**labels)
+            metrics.sheets_request_duration.observe(time.monotonic() - started, **labels)
+            if received:
+                metrics.sheets_response_bytes.inc(received, **labels)
+
     def read_sheet(self, range_name: str) -> List[Dict[str, Any]]:
-        """Read data from specified range in Google Sheets"""
+        """Read data from specified range in Google Sheets (served from the read cache)"""
+        sheet_range = self.cache.get(range_name, lambda: self._load_ranges([range_name])[range_name])
+        # Callers are free to mutate what they get back, so never hand out cached dicts
+        return _copy_rows(sheet_range.rows)
+
+    def read_records(self, range_name: str) -> List[Any]:
+        """Read a media or entries range as typed records (see models.models).
+
+        The records are parsed once per refresh and shared with the read cache,
+        so they must be treated as read-only.
+        """
+        sheet_range = self.cache.get(range_name, lambda: self._load_ranges([range_name])[range_name])
+        if sheet_range.records is None:
+            raise ValueError(f"No record type for range {range_name}")
+        return sheet_range.records
+
+    def read_sheets(self, ranges: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Read several ranges at once; cache misses are fetched in one batchGet round trip"""
+        snapshot = self.read_snapshot(ranges)
+        return {
+            range_name: _copy_rows(rows)
+            for range_name, rows in snapshot.data.items()
+        }
+
+    def read_snapshot(self, ranges: List[str]) -> SheetSnapshot:
+        """Like read_sheets, but without copying rows and with a content version"""
+        ranges_by_name = self.cache.get_many(list(ranges), self._load_ranges)
+        version = hashlib.sha1()
+        for range_name in ranges:
+            version.update(f'{range_name}={ranges_by_name[range_name].version};'.encode())
+        return SheetSnapshot(
+            data={range_name: ranges_by_name[range_name].rows for range_name in ranges},
+            version=version.hexdigest(),
+            last_modified=max(ranges_by_name[range_name].changed_at for range_name in ranges),
+            records={range_name: ranges_by_name[range_name].records for range_name in ranges
+                     if ranges_by_name[range_name].records is not None}
+        )
+
+    def invalidate_range(self, range_name: str) -> None:
+        """Drop cached reads of every range on the sheet that range_name points at"""
+        sheet_name = sheet_name_of(range_name)
+        self.cache.invalidate(lambda key: sheet_name_of(key) == sheet_name)
+        # Reads already in flight started before the write; later readers fetch again
+        self.single_flight.forget(lambda key: sheet_name_of(key) == sheet_name)
         try:
-            service = build('sheets', 'v4', credentials=self.creds)
-            sheet = service.spreadsheets()
-            result = sheet.values().get(
+            self.snapshot_store.mark_written(sheet_name)
+        except OSError as e:
+            logger.warning(f"Could not mark {sheet_name} as written for other workers: {e}")
+
+    def _load_ranges(self, ranges: List[str]) -> Dict[str, SheetRange]:
+        """Cache loader: fetch ranges, joining any fetch of the same range already in flight"""
+        return self.single_flight.do_many(list(ranges), self._load_shared)
+
+    def _load_shared(self, ranges: List[str]) -> Dict[str, SheetRange]:
+        """Take ranges from another worker's recent refresh, or fetch them and share them"""
+        loaded = self._from_shared(ranges) if SHEETS_SHARED_SNAPSHOT else {}
+        missing = [range_name for range_name in ranges if range_name not in loaded]
+        if missing:
+            # No cross-worker lock is held while fetching (that would make the
+            # other workers wait out this one's quota backoff); at worst two
+            # workers fetch the same range
+            fetch_started_at = time.time()
+            fetched = self._fetch_ranges(missing)
+            self._save_shared(fetched, fetch_started_at)  # Also kept for FAST_START
+            loaded.update(fetched)
+        if SHEETS_SHARED_SNAPSHOT:
+            self.shared_hits += len(loaded) - len(missing)
+            self.shared_misses += len(missing)
+        return loaded
+
+    def _fetch_ranges(self, ranges: List[str]) -> Dict[str, SheetRange]:
+        if len(ranges) == 1:
+            return {ranges[0]: self._fetch_sheet(ranges[0])}
+        return self._fetch_sheets(ranges)
+
+    def _fetch_sheet(self, range_name: str) -> SheetRange:
+        """Read a range straight from the Sheets API"""
+        if range_name in TAIL_SYNC_RANGES:
+            return self._fetch_sheets([range_name])[range_name]
+        try:
+            result = self._execute(self.values().get(
                 spreadsheetId=self.spreadsheet_id,
                 range=range_name
-            ).execute()
+            ), range_name)
             
-            values = result.get('values', [])
-            if not values:
-                return []
-                
-            # Convert to list of dictionaries
-            headers = values[0]
-            return [dict(zip(headers, row)) for row in values[1:]]
+            return self._range_from_values(range_name, result.get('values', []))
             
         except HttpError as err:
             print(f"Error reading from Google Sheets: {err}")
             raise
 
+    def _fetch_sheets(self, ranges: List[str]) -> Dict[str, SheetRange]:
+        """Read several ranges straight from the Sheets API with one batchGet"""
+        # Tail-synced ranges with a recent enough full read only ask for new rows
+        tail_bases = {}
+        requested = []
+        for range_name in ranges:
+            base = self._tail_sync_base(range_name)
+            if base is not None:
+                tail_bases[range_name] = base
+                requested.append(tail_range(range_name, first_row_of(range_name) + 1 + len(base.rows)))
+            else:
+                requested.append(range_name)
+        started_at = time.time()
+        try:
+            result = self._execute(self.values().batchGet(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=requested
+            ), ','.join(ranges))
+            
+            # valueRanges come back in request order, with normalized range names
+            value_ranges = result.get('valueRanges', [])
+            fetched = {}
+            for range_name, value_range in zip(ranges, value_ranges):
+                values = value_range.get('values', [])
+                if range_name in tail_bases:
+                    fetched[range_name] = self._extend_range(range_name, tail_bases[range_name], values)
+                else:
+                    fetched[range_name] = self._range_from_values(range_name, values)
+                    if range_name in TAIL_SYNC_RANGES:
+                        with self._tail_lock:
+                            self._tail_base[range_name] = fetched[range_name]
+                            self._full_synced_at[range_name] = started_at
+            return fetched
+            
+        except HttpError as err:
+            print(f"Error batch reading from Google Sheets: {err}")
+            raise
+
+    def _tail_sync_base(self, range_name: str) -> Optional[SheetRange]:
+        """Return the range to fetch new rows on top of, or None if a full read is due"""
+        if range_name not in TAIL_SYNC_RANGES:
+            return None
+        with self._tail_lock:
+            full_synced_at = self._full_synced_at.get(range_name)
+            if full_synced_at is None or time.time() - full_synced_at >= SHEETS_FULL_SYNC_INTERVAL:
+                return None
+            base = self._tail_base.get(range_name)
+        # Without a header row there is nothing to name the new cells by
+        return base if base is not None and base.headers else None
+
+    def _extend_range(self, range_name: str, base: SheetRange, values: List[List[Any]]) -> SheetRange:
+        """Merge rows fetched past the end of base into a new SheetRange"""
+        if not values:
+            return base
+        new_rows = [dict(zip(base.headers, row)) for row in values]
+        rows = base.rows + new_rows
+        # Only the new rows need parsing
+        records = None
+        if isinstance(rows, RecordRows):
+            records = rows.records  # Parsed the new rows while adding them
+        elif base.records is not None:
+            records = base.records + parse_records(sheet_name_of(range_name), new_rows)
+        sheet_range = self._make_range(range_name, rows, chain_version(base.version, values), base.headers,
+                                       records)
+        with self._tail_lock:
+            # A concurrent sync may have got further already
+            current = self._tail_base.get(range_name)
+            if current is None or len(current.rows) <= len(rows):
+                self._tail_base[range_name] = sheet_range
+        return sheet_range
+
+    def _range_from_values(self, range_name: str, values: List[List[Any]]) -> SheetRange:
+        """Convert raw sheet values (header row first) to a list of dictionaries"""
+        if range_name in TAIL_SYNC_RANGES:
+            version = chain_version('', values)
+        else:
+            version = hashlib.sha1(json.dumps(values, separators=(',', ':')).encode()).hexdigest()
+
+        if not values:
+            return self._make_range(range_name, [], version, [])
+        headers = values[0]
+        rows = [dict(zip(headers, row)) for row in values[1:]]
+        return self._make_range(range_name, rows, version, headers)
+
+    def _make_range(self, range_name: str, rows: Sequence[Dict[str, Any]], version: str,
+                    headers: List[str], records: Optional[List[Any]] = None) -> SheetRange:
+        previous = self._changed_at.get(range_name)
+        if previous is not None and previous[0] == version:
+            changed_at = previous[1]
+        else:
+            changed_at = time.time()
+            self._changed_at[range_name] = (version, changed_at)
+        if records is None:
+            records = parse_records(sheet_name_of(range_name), rows)
+        # Where the records keep every cell the row dicts can go
+        rows = record_rows(sheet_name_of(range_name), records, headers) or rows
+        sheet_range = SheetRange(rows=rows, version=version, changed_at=changed_at, headers=headers, records=records)
+        self._last_range[range_name] = sheet_range
+        return sheet_range
+
     def update_sheet(self, range_name: str, values: List[List[Any]]) -> bool:
         """Update data in specified range in Google Sheets"""
         try:
-            service = build('sheets', 'v4', credentials=self.creds)
-            sheet = service.spreadsheets()
-            
             body = {
                 'values': values
             }
             
-            result = sheet.values().update(
+            result = self._execute(self.values().update(
                 spreadsheetId=self.spreadsheet_id,
                 range=range_name,
                 valueInputOption='RAW',
                 body=body
-            ).execute()
+            ), range_name)
             
+            self.invalidate_range(range_name)
             return True
             
         except HttpError as err:
@@ -99,81 +619,117 @@ class GoogleSheetsManager:
 
     def append_row(self, range_name: str, row_data: List[Any]) -> bool:
         """Append a new row to the sheet"""
+        return self.append_rows(range_name, [row_data])
+
+    def append_rows(self, range_name: str, rows: List[List[Any]]) -> bool:
+        """Append several rows to the sheet in one request"""
+        self.append_values(range_name, rows)
+        return True
+
+    def append_values(self, range_name: str, rows: List[List[Any]]) -> Dict[str, Any]:
+        """Append rows and return the API's 'updates' block (updatedRange tells where they went)"""
         try:
-            service = build('sheets', 'v4', credentials=self.creds)
-            sheet = service.spreadsheets()
-            
             body = {
-                'values': [row_data]
+                'values': rows
             }
             
-            result = sheet.values().append(
+            result = self._execute(self.values().append(
                 spreadsheetId=self.spreadsheet_id,
                 range=range_name,
                 valueInputOption='RAW',
                 insertDataOption='INSERT_ROWS',
                 body=body
-            ).execute()
+            ), range_name)
             
-            return True
+            self.invalidate_range(range_name)
+            return result.get('updates', {})
             
         except HttpError as err:
             print(f"Error appending to Google Sheets: {err}")
             raise
 
+    def batch_update(self, data: List[Dict[str, Any]]) -> bool:
+        """Write several ranges ([{'range': ..., 'values': [[...]]}, ...]) in one request"""
+        if not data:
+            return True
+        try:
+            sheet_names = sorted({sheet_name_of(update['range']) for update in data})
+            self._execute(self.values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={'valueInputOption': 'RAW', 'data': data}
+            ), ','.join(sheet_names))
+            
+            for sheet_name in sheet_names:
+                self.invalidate_range(sheet_name)
+            return True
+            
+        except HttpError as err:
+            print(f"Error batch updating Google Sheets: {err}")
+            raise
+
+    def read_values(self, ranges: List[str], range_label: Optional[str] = None) -> Dict[str, List[List[Any]]]:
+        """Read raw cell values of several ranges in one uncached batchGet"""
+        try:
+            result = self._execute(self.values().batchGet(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=list(ranges)
+            ), ','.join(ranges) if range_label is None else range_label)
+            value_ranges = result.get('valueRanges', [])
+            return {
+                range_name: value_range.get('values', [])
+                for range_name, value_range in zip(ranges, value_ranges)
+            }
+            
+        except HttpError as err:
+            print(f"Error batch reading from Google Sheets: {err}")
+            raise
+
+    def iter_rows(self, sheet_name: str, columns: str = 'A:Z', chunk_size: int = 1000,
+                  start_row: int = 2, raw: bool = False) -> Iterator[Any]:
+        """Yield a sheet's rows from start_row down, reading chunk_size rows per (uncached) request.
+
+        Rows come as dictionaries keyed by the header row or, with raw, as
+        (row number, cells) pairs. Only one chunk is held at a time, so memory
+        doesn't grow with the sheet. The walk ends at the first chunk with no
+        cells at all, so pass every column with data for a sheet whose values
+        may be blank.
+        """
+        first_column, _, last_column = columns.partition(':')
+        last_column = last_column or first_column
+        headers: List[str] = []
+        if not raw:
+            header_range = f'{sheet_name}!{first_column}1:{last_column}1'
+            header = self.read_values([header_range])[header_range]
+            if not header:
+                return
+            headers = header[0]
+        start = start_row
+        while True:
+            chunk_range = f'{sheet_name}!{first_column}{start}:{last_column}{start + chunk_size - 1}'
+            values = self.read_values([chunk_range], f'{sheet_name}!{columns}')[chunk_range]
+            # Trailing blank rows aren't returned, so a short chunk isn't
+            # necessarily the last one; only an empty one is
+            if not values:
+                return
+            for offset, row in enumerate(values):
+                yield (start + offset, row) if raw else dict(zip(headers, row))
+            start += chunk_size
+
     def generate_id(self) -> str:
         """Generate a unique ID"""
         return str(uuid.uuid4())[:8]  # Using first 8 characters of UUID for readability
 
     def update_missing_ids(self, sheet_name: str) -> bool:
-        """Update rows that have missing IDs in the specified sheet"""
+        """Update rows that have missing IDs in the specified sheet.
+
+        Walks the sheet a window of rows at a time and writes the new IDs in
+        bounded batches (see services.sheet_maintenance).
+        """
+        from services.sheet_maintenance import run
         try:
-            # Read all data including headers
-            service = build('sheets', 'v4', credentials=self.creds)
-            sheet = service.spreadsheets()
-            result = sheet.values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=f'{sheet_name}!A1:Z'  # Read all columns
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values:
-                return True  # Nothing to update
-                
-            headers = values[0]
-            id_column = 0  # Assuming ID is always first column
-            
-            # Find rows without IDs
-            updates = []
-            for row_idx, row in enumerate(values[1:], start=2):  # Start from 2 to account for header row
-                # If row has no ID (empty or doesn't exist)
-                if len(row) == 0 or not row[0]:
-                    new_id = self.generate_id()
-                    
-                    # If row exists but ID is empty
-                    if len(row) > 0:
-                        row[0] = new_id
-                        updates.append({
-                            'range': f'{sheet_name}!A{row_idx}',
-                            'values': [[new_id]]
-                        })
-                    else:
-                        # If entire row is empty, skip it
-                        continue
-            
-            if updates:
-                body = {
-                    'valueInputOption': 'RAW',
-                    'data': updates
-                }
-                
-                result = sheet.values().batchUpdate(
-                    spreadsheetId=self.spreadsheet_id,
-                    body=body
-                ).execute()
-                
-                print(f"Updated {len(updates)} rows with new IDs")
-                
+            count = run(self, 'ids', sheet_name)
+            if count:
+                print(f"Updated {count} rows with new IDs")
             return True
             
         except HttpError as err:
@@ -182,56 +738,11 @@ class GoogleSheetsManager:
 
     def update_media_paths(self, sheet_name: str = 'media') -> bool:
         """Update media paths to match the correct format and actual filenames"""
+        from services.sheet_maintenance import run
         try:
-            # Read current data
-            service = build('sheets', 'v4', credentials=self.creds)
-            sheet = service.spreadsheets()
-            result = sheet.values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=f'{sheet_name}!A1:Z'
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values:
-                return True
-                
-            headers = values[0]
-            # Find media_path column index
-            path_col_idx = headers.index('media_path')
-            
-            # Find rows that need path updates
-            updates = []
-            for row_idx, row in enumerate(values[1:], start=2):  # Start from 2 to account for header
-                if len(row) <= path_col_idx:
-                    continue
-                    
-                current_path = row[path_col_idx]
-                
-                # Extract just the filename if it's a full path
-                filename = os.path.basename(current_path)
-                
-                # Clean up the filename (remove any spaces, special characters)
-                clean_filename = filename.replace(' ', '_').lower()
-                
-                if current_path != clean_filename:
-                    updates.append({
-                        'range': f'{sheet_name}!{chr(65 + path_col_idx)}{row_idx}',  # Convert column index to letter
-                        'values': [[clean_filename]]
-                    })
-            
-            if updates:
-                body = {
-                    'valueInputOption': 'RAW',
-                    'data': updates
-                }
-                
-                result = sheet.values().batchUpdate(
-                    spreadsheetId=self.spreadsheet_id,
-                    body=body
-                ).execute()
-                
-                print(f"Updated {len(updates)} media paths")
-                
+            count = run(self, 'paths', sheet_name)
+            if count:
+                print(f"Updated {count} media paths")
             return True
             
         except HttpError as err:
@@ -263,16 +774,21 @@ class GoogleSheetsManager:
             return False
 
 def main():
-    """Command-line entry point for updating sheet IDs"""
+    """Command-line entry point for updating sheet IDs (of the sheets named as arguments, default media).
+
+    python -m services.sheet_maintenance has the full set of options
+    (dry run, media paths, resuming).
+    """
     # Load environment variables
     load_dotenv()
     
     try:
         # Initialize the sheets manager
-        manager = GoogleSheetsManager()
+        manager = GoogleSheetsManager(fast_start=False)
         
-        # Update missing IDs in the media sheet
-        manager.update_sheet_ids('media')
+        # Update missing IDs in each sheet
+        for sheet_name in sys.argv[1:] or ['media']:
+            manager.update_sheet_ids(sheet_name)
             
     except Exception as e:
         print(f"An error occurred: {str(e)}")
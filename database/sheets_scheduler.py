@@ -0,0 +1,152 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from googleapiclient.errors import HttpError
+
+# Sheets allows 60 read and 60 write requests per minute per user, and all
+# workers share the service account, so each process gets a share of that
+SHEETS_READS_PER_MINUTE = float(os.getenv('SHEETS_READS_PER_MINUTE', '30'))
+SHEETS_WRITES_PER_MINUTE = float(os.getenv('SHEETS_WRITES_PER_MINUTE', '30'))
+SHEETS_BURST = int(os.getenv('SHEETS_BURST', '10'))
+
+# Longest a request may wait for quota (and retries) before it is shed (seconds)
+SHEETS_QUEUE_DEADLINE = float(os.getenv('SHEETS_QUEUE_DEADLINE', '10'))
+
+# Retries of 429/5xx/network errors, with full-jitter exponential backoff (seconds)
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '4'))
+SHEETS_BACKOFF_BASE = float(os.getenv('SHEETS_BACKOFF_BASE', '0.5'))
+SHEETS_BACKOFF_MAX = float(os.getenv('SHEETS_BACKOFF_MAX', '16'))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsBusyError(Exception):
+    """A Sheets request was shed because it couldn't get quota before its deadline"""
+
+
+class TokenBucket:
+    """Allows `per_minute` requests per minute on average, and up to `burst` at once"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token, returning 0, or return how many seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class _Lane:
+    """A token bucket plus the counters reported by SheetsScheduler.stats()"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.bucket = TokenBucket(per_minute, burst)
+        self.queued = 0
+        self.requests = 0
+        self.throttled = 0  # Requests that had to wait for a token
+        self.shed = 0
+        self.retries = 0
+        self.errors = 0
+
+
+class SheetsScheduler:
+    """Rate limits and retries Sheets API calls.
+
+    Reads and writes have separate quotas in Sheets, so each gets its own lane
+    (token bucket). A call waits for a token of its lane; one that can't get
+    a token before its deadline is shed with SheetsBusyError instead of
+    adding to a 429 storm. Rate-limit and server errors are retried with
+    full-jitter exponential backoff; non-idempotent calls (appends) are only
+    retried on 429, where Sheets guarantees nothing was written.
+    """
+
+    def __init__(self, reads_per_minute: float = SHEETS_READS_PER_MINUTE,
+                 writes_per_minute: float = SHEETS_WRITES_PER_MINUTE, burst: int = SHEETS_BURST,
+                 deadline: float = SHEETS_QUEUE_DEADLINE, max_retries: int = SHEETS_MAX_RETRIES):
+        self.lanes = {
+            'read': _Lane(reads_per_minute, burst),
+            'write': _Lane(writes_per_minute, burst),
+        }
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+
+    def run(self, lane_name: str, call: Callable[[], Any], idempotent: bool = True,
+            deadline: Optional[float] = None) -> Any:
+        """Run call() under lane_name's quota, retrying retryable failures"""
+        lane = self.lanes[lane_name]
+        give_up_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            self._acquire(lane_name, lane, give_up_at)
+            try:
+                return call()
+            except (HttpError, OSError) as err:
+                status = err.resp.status if isinstance(err, HttpError) else None
+                retryable = status in RETRYABLE_STATUSES if status is not None else True
+                if not idempotent:
+                    retryable = status == 429
+                delay = random.uniform(0, min(SHEETS_BACKOFF_MAX, SHEETS_BACKOFF_BASE * 2 ** attempt))
+                if not retryable or attempt >= self.max_retries or time.monotonic() + delay > give_up_at:
+                    with self._lock:
+                        lane.errors += 1
+                    raise
+                with self._lock:
+                    lane.retries += 1
+                logger.warning(f"Sheets {lane_name} request failed ({status or err}), "
+                               f"retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _acquire(self, lane_name: str, lane: _Lane, give_up_at: float) -> None:
+        with self._lock:
+            lane.requests += 1
+        wait = lane.bucket.try_acquire()
+        if not wait:
+            return
+        with self._lock:
+            lane.throttled += 1
+            lane.queued += 1
+        try:
+            while wait:
+                if time.monotonic() + wait > give_up_at:
+                    with self._lock:
+                        lane.shed += 1
+                    logger.warning(f"Shedding Sheets {lane_name} request: over quota until past its deadline")
+                    raise SheetsBusyError(f"Sheets {lane_name} quota exhausted")
+                time.sleep(wait)
+                wait = lane.bucket.try_acquire()
+        finally:
+            with self._lock:
+                lane.queued -= 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-lane queue depth, available tokens and throttle/shed/retry/error counts"""
+        with self._lock:
+            return {
+                name: {
+                    'queued': lane.queued,
+                    'tokens': round(lane.bucket.tokens, 2),
+                    'requests': lane.requests,
+                    'throttled': lane.throttled,
+                    'shed': lane.shed,
+                    'retries': lane.retries,
+                    'errors': lane.errors,
+                }
+                for name, lane in self.lanes.items()
+            }
@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same keys into one call.
+
+    While a key is being loaded, other threads asking for it wait for that
+    load and share its result (or its exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.loads = 0  # Keys actually loaded
+        self.coalesced = 0  # Keys served by a load another thread started
+
+    def do(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Load key with loader, or wait for the load already in flight"""
+        return self.do_many([key], lambda keys: {key: loader()})[key]
+
+    def do_many(self, keys: List[Hashable],
+                loader: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """Like do() for several keys; keys nobody is loading yet go to one loader call"""
+        own: Dict[Hashable, _Call] = {}
+        waiting: Dict[Hashable, _Call] = {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = own[key] = self._calls[key] = _Call()
+                else:
+                    waiting[key] = call
+            self.loads += len(own)
+            self.coalesced += len(waiting)
+
+        results: Dict[Hashable, Any] = {}
+        if own:
+            try:
+                loaded = loader(list(own))
+            except BaseException as e:
+                for call in own.values():
+                    call.error = e
+                raise
+            else:
+                for key, call in own.items():
+                    call.result = loaded[key]
+                results.update(loaded)
+            finally:
+                with self._lock:
+                    for key, call in own.items():
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                for call in own.values():
+                    call.done.set()
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+        return results
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Stop handing in-flight loads of matching keys to new callers (e.g. after a write)"""
+        with self._lock:
+            for key in [key for key in self._calls if predicate(key)]:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'in_flight': len(self._calls), 'loads': self.loads, 'coalesced': self.coalesced}
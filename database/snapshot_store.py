@@ -0,0 +1,219 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from services.cooperative import run_blocking
+
+# Last good copy of every range read from Sheets, shared by all workers and
+# used to serve right after boot
+SHEETS_SNAPSHOT_PATH = os.getenv('SHEETS_SNAPSHOT_PATH', os.path.join('data', 'sheets_snapshot.json'))
+
+# Longest a save waits for another worker's write to the files before it is skipped (seconds)
+SHEETS_SNAPSHOT_LOCK_WAIT = float(os.getenv('SHEETS_SNAPSHOT_LOCK_WAIT', '5'))
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """JSON files holding the last fetched rows of each range, shared across workers.
+
+    The data file maps range name -> {'rows', 'version', 'changed_at',
+    'headers'} and is only rewritten when a range's content changes. A small
+    meta file next to it maps range name -> {'version', 'fetched_at',
+    'fetch_started_at', 'full_synced_at'} and is rewritten on every refresh,
+    so other workers can tell how fresh the data is without re-reading the
+    rows. Both are always replaced atomically, so a crash mid-write leaves
+    the previous version.
+
+    Each file is parsed again only when it was replaced (its inode, size or
+    mtime changed). Saves merge into the files under a cross-worker file
+    lock; save_later() does that on a background thread, so requests never
+    wait for the JSON dump.
+    """
+
+    def __init__(self, path: str = SHEETS_SNAPSHOT_PATH):
+        self.path = path
+        self.meta_path = f'{path}.meta'
+        self.lock_path = f'{path}.lock'
+        self._lock = threading.Lock()
+        self._ranges: Dict[str, Dict[str, Any]] = {}
+        self._ranges_stat: Optional[Tuple[int, int, int]] = None
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._meta_stat: Optional[Tuple[int, int, int]] = None
+        # Saves queued for the background writer
+        self._pending_cond = threading.Condition()
+        self._pending_ranges: Dict[str, Dict[str, Any]] = {}
+        self._pending_meta: Dict[str, Dict[str, Any]] = {}
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Return the persisted ranges, or {} if there is no usable snapshot"""
+        self._remove_stale_tmp_files()
+        return self.read()[0]
+
+    def read(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Return (ranges, meta) as last written by any worker"""
+        with self._lock:
+            self._ranges, self._ranges_stat = self._reload(self.path, self._ranges, self._ranges_stat)
+            self._meta, self._meta_stat = self._reload(self.meta_path, self._meta, self._meta_stat)
+            return self._ranges, self._meta
+
+    def share_rows(self, range_name: str, version: str, rows: Any) -> None:
+        """Swap the rows read from the file for range_name (if still at version) for an equal sequence the caller keeps"""
+        with self._lock:
+            data = self._ranges.get(range_name)
+            if data is not None and data.get('version') == version and data['rows'] is not rows:
+                self._ranges = dict(self._ranges)
+                self._ranges[range_name] = dict(data, rows=rows)
+
+    def save_later(self, ranges: Dict[str, Dict[str, Any]], meta: Dict[str, Dict[str, Any]]) -> None:
+        """Queue ranges and their meta for save() on a background thread (a later save of a range replaces an earlier one)"""
+        with self._pending_cond:
+            self._pending_ranges.update(ranges)
+            self._pending_meta.update(meta)
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                self._writer = threading.Thread(target=self._write_pending, name='snapshot-writer', daemon=True)
+                self._writer.start()
+            self._pending_cond.notify()
+
+    def save(self, ranges: Dict[str, Dict[str, Any]], meta: Dict[str, Dict[str, Any]],
+             timeout: float = SHEETS_SNAPSHOT_LOCK_WAIT) -> bool:
+        """Merge ranges and their meta into the files, returning whether the rows were rewritten.
+
+        The files are re-read and rewritten under the cross-worker lock, so
+        concurrent saves don't lose each other's ranges; ranges that another
+        worker has since fetched more recently are left alone. Nothing is
+        written if the lock can't be had within timeout.
+        """
+        with self._file_lock(timeout) as acquired:
+            if not acquired:
+                logger.warning(f"Snapshot {self.path} stayed locked by another worker; not saving")
+                return False
+            with self._lock:
+                self._ranges, self._ranges_stat = self._reload(self.path, self._ranges, self._ranges_stat)
+                self._meta, self._meta_stat = self._reload(self.meta_path, self._meta, self._meta_stat)
+                newer = {name for name, info in meta.items()
+                         if (self._meta.get(name) or {}).get('fetch_started_at', 0) > info.get('fetch_started_at', 0)}
+                ranges = {name: data for name, data in ranges.items() if name not in newer}
+                meta = {name: info for name, info in meta.items() if name not in newer}
+                rows_changed = not all(self._ranges.get(name, {}).get('version') == data['version']
+                                       for name, data in ranges.items())
+                current = dict(self._ranges)
+                current.update(ranges)
+                current_meta = dict(self._meta)
+                current_meta.update(meta)
+            # Written outside self._lock: only this worker's readers would wait for it
+            if rows_changed:
+                if not self._write(self.path, current):
+                    return False
+                with self._lock:
+                    self._ranges, self._ranges_stat = current, self._stat(self.path)
+            if self._write(self.meta_path, current_meta):
+                with self._lock:
+                    self._meta, self._meta_stat = current_meta, self._stat(self.meta_path)
+            return rows_changed
+
+    def _write_pending(self) -> None:
+        while True:
+            with self._pending_cond:
+                self._pending_cond.wait_for(lambda: self._pending_meta)
+                ranges, meta = self._pending_ranges, self._pending_meta
+                self._pending_ranges, self._pending_meta = {}, {}
+            try:
+                self.save(ranges, meta)
+            except Exception as e:
+                logger.warning(f"Could not save snapshot {self.path}: {e}")
+
+    @contextmanager
+    def _file_lock(self, timeout: float) -> Iterator[bool]:
+        """Hold the cross-worker write lock, yielding False if it couldn't be had within timeout"""
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            give_up_at = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= give_up_at:
+                        acquired = False
+                        break
+                    # Polling keeps this cooperative under gevent
+                    time.sleep(0.05)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def mark_written(self, sheet_name: str) -> None:
+        """Record that a sheet was just written to, so no worker reuses data fetched before now"""
+        marker = f'{self.path}.{sheet_name}.written'
+        os.makedirs(os.path.dirname(marker) or '.', exist_ok=True)
+        with open(marker, 'a'):
+            os.utime(marker, None)
+
+    def written_at(self, sheet_name: str) -> float:
+        """Unix time a worker last wrote to sheet_name (0 if never)"""
+        try:
+            return os.stat(f'{self.path}.{sheet_name}.written').st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _reload(self, path: str, current: Dict[str, Dict[str, Any]],
+                current_stat: Optional[Tuple[int, int, int]]) -> Tuple[Dict[str, Dict[str, Any]], Any]:
+        stat = self._stat(path)
+        if stat is None:
+            return {}, None
+        if stat == current_stat:
+            return current, current_stat
+        try:
+            with open(path, encoding='utf-8') as f:
+                return dict(json.load(f)), stat
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return {}, stat
+
+    def _write(self, path: str, data: Dict[str, Dict[str, Any]]) -> bool:
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            # Dumping the whole snapshot takes a while; under gevent it runs off the hub
+            run_blocking(_write_json, path, tmp_path, data)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not write snapshot {path}: {e}")
+            return False
+
+    def _remove_stale_tmp_files(self) -> None:
+        # Left behind by a worker killed mid-write
+        for tmp_path in glob.glob(f'{self.path}*.tmp'):
+            try:
+                if time.time() - os.path.getmtime(tmp_path) > 300:
+                    os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _write_json(path: str, tmp_path: str, data: Dict[str, Dict[str, Any]]) -> None:
+    # Write then rename, so readers only ever see a complete file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # Rows rebuilt from records (models.RecordRows) are written as plain lists
+        json.dump(data, f, separators=(',', ':'), default=list)
+    os.replace(tmp_path, path)
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
+from .storage import StorageBackend, MEDIA_COLUMNS, ENTRY_COLUMNS
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join('data', 'isee.db'))
+
+# Idle connections kept per process
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id TEXT,
+    "order" INTEGER,
+    media_name TEXT,
+    media_path TEXT,
+    text TEXT,
+    linkie TEXT,
+    is_horizontal INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_media_id ON media(id);
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT,
+    media_id TEXT,
+    entry_text TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_media_id ON entries(media_id);
+"""
+
+
+def _quoted(columns: List[str]) -> str:
+    # "order" is a keyword, so every column name is quoted
+    return ', '.join(f'"{column}"' for column in columns)
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite backend in WAL mode, with media.id and entries.media_id indexed.
+
+    Lookups, single-row updates and appends touch only the rows involved
+    instead of rewriting a whole file. Connections are pooled per process and
+    each call runs in its own transaction on one of them.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        # Not threading.local: under gevent that would be one connection per request
+        self._pool: List[sqlite3.Connection] = []
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Pooled connections move between threads, one at a time
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers in other workers carry on while one of them writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection and run one transaction on it (committed unless it raises)"""
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                # Never use a connection inherited across a fork
+                self._pool = []
+                self._pool_pid = os.getpid()
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            with self._pool_lock:
+                if self._pool_pid == os.getpid() and len(self._pool) < SQLITE_POOL_SIZE:
+                    self._pool.append(conn)
+                else:
+                    conn.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def get_media(self) -> List[Dict[str, Any]]:
+        return self._query(f'SELECT {_quoted(MEDIA_COLUMNS)} FROM media ORDER BY rowid')
+
+    def get_entries(self) -> List[Dict[str, Any]]:
+        return self._query(f'SELECT {_quoted(ENTRY_COLUMNS)} FROM entries ORDER BY rowid')
+
+    def get_media_by_id(self, media_id: Any) -> List[Dict[str, Any]]:
+        """Get the media rows with this id (an index lookup)"""
+        return self._query(f'SELECT {_quoted(MEDIA_COLUMNS)} FROM media WHERE id = ?', (str(media_id),))
+
+    def get_entries_for_media(self, media_id: Any) -> List[Dict[str, Any]]:
+        """Get the entries of one card, in insertion order (an index lookup)"""
+        return self._query(
+            f'SELECT {_quoted(ENTRY_COLUMNS)} FROM entries WHERE media_id = ? ORDER BY rowid',
+            (str(media_id),)
+        )
+
+    def update_media(self, media_id: Any, updates: Dict[str, Any]) -> bool:
+        columns = [column for column in MEDIA_COLUMNS if column in updates]
+        if not columns:
+            return bool(self.get_media_by_id(media_id))
+        assignments = ', '.join(f'"{column}" = ?' for column in columns)
+        with self._connection() as conn:
+            cursor = conn.execute(
+                f'UPDATE media SET {assignments} WHERE id = ?',
+                tuple(updates[column] for column in columns) + (str(media_id),)
+            )
+        return cursor.rowcount > 0
+
+    def append_media(self, media_data: Dict[str, Any]) -> bool:
+        return self._insert('media', MEDIA_COLUMNS, [media_data])
+
+    def append_entry(self, entry_data: Dict[str, Any]) -> bool:
+        return self._insert('entries', ENTRY_COLUMNS, [entry_data])
+
+    def import_from(self, source: StorageBackend) -> None:
+        """Replace this database's contents with everything in another backend (all or nothing)"""
+        data = source.get_story_data()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM media')
+            conn.execute('DELETE FROM entries')
+            self._insert_rows(conn, 'media', MEDIA_COLUMNS, data['media'])
+            self._insert_rows(conn, 'entries', ENTRY_COLUMNS, data['entries'])
+
+    def _insert(self, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> bool:
+        with self._connection() as conn:
+            self._insert_rows(conn, table, columns, rows)
+        return True
+
+    @staticmethod
+    def _insert_rows(conn: sqlite3.Connection, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(
+            f'INSERT INTO {table} ({_quoted(columns)}) VALUES ({placeholders})',
+            [tuple(row.get(column, '') for column in columns) for row in rows]
+        )
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from models.models import Media, Entry
+from .sheets_manager import GoogleSheetsManager, MEDIA_RANGE, ENTRIES_RANGE, column_letter, first_row_of
+
+# How long the media id -> row number index is kept before it is re-read
+# (writes check it against the sheet either way, see update_media_many)
+MEDIA_ROW_INDEX_TTL = float(os.getenv('MEDIA_ROW_INDEX_TTL', '300'))
+
+# Column order of the media and entries tables, shared by every backend
+MEDIA_COLUMNS = ['id', 'order', 'media_name', 'media_path', 'text', 'linkie', 'is_horizontal']
+ENTRY_COLUMNS = ['id', 'media_id', 'entry_text', 'timestamp']
+
+
+class StorageBackend:
+    """Where DataManager keeps media and entries. Subclasses implement every method."""
+
+    def get_media(self) -> List[Dict[str, Any]]:
+        """Get all media rows"""
+        raise NotImplementedError
+
+    def get_entries(self) -> List[Dict[str, Any]]:
+        """Get all entry rows"""
+        raise NotImplementedError
+
+    def get_story_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get media and entries rows together ({'media': [...], 'entries': [...]})"""
+        return {'media': self.get_media(), 'entries': self.get_entries()}
+
+    def get_media_records(self) -> List[Media]:
+        """Get all media as typed records"""
+        return [Media.from_row(row) for row in self.get_media()]
+
+    def get_entry_records(self) -> List[Entry]:
+        """Get all entries as typed records"""
+        return [Entry.from_row(row) for row in self.get_entries()]
+
+    def update_media(self, media_id: Any, updates: Dict[str, Any]) -> bool:
+        """Update one media row by id, returning False if there is no such row"""
+        raise NotImplementedError
+
+    def update_media_many(self, updates: Dict[Any, Dict[str, Any]]) -> Dict[Any, bool]:
+        """Apply {media_id: updates} edits, returning {media_id: found}"""
+        return {media_id: self.update_media(media_id, changes) for media_id, changes in updates.items()}
+
+    def append_media(self, media_data: Dict[str, Any]) -> bool:
+        """Add a media row"""
+        raise NotImplementedError
+
+    def append_entry(self, entry_data: Dict[str, Any]) -> bool:
+        """Add an entry row"""
+        raise NotImplementedError
+
+
+class SheetsStorage(StorageBackend):
+    """Google Sheets backend (the 'media' and 'entries' sheets).
+
+    Media edits go through an id -> sheet row number index, so updating any
+    number of rows costs one small read (checking the index still matches
+    the sheet) and one batchUpdate instead of re-reading the whole sheet per
+    edit.
+    """
+
+    def __init__(self, sheets_manager: Optional[GoogleSheetsManager] = None):
+        self.sheets_manager = sheets_manager or GoogleSheetsManager()
+        self._index_lock = threading.Lock()
+        self._row_index: Dict[str, int] = {}
+        self._headers: List[str] = []
+        self._index_loaded_at: Optional[float] = None
+
+    def get_media(self) -> List[Dict[str, Any]]:
+        return self.sheets_manager.read_sheet('media!A1:F')  # Using 'media' sheet
+
+    def get_entries(self) -> List[Dict[str, Any]]:
+        return self.sheets_manager.read_sheet('entries!A1:C')  # Using 'entries' sheet
+
+    def get_story_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        data = self.sheets_manager.read_sheets([MEDIA_RANGE, ENTRIES_RANGE])
+        return {'media': data[MEDIA_RANGE], 'entries': data[ENTRIES_RANGE]}
+
+    def get_media_records(self) -> List[Media]:
+        # Parsed once per refresh and shared with the read cache
+        return list(self.sheets_manager.read_records(MEDIA_RANGE))
+
+    def get_entry_records(self) -> List[Entry]:
+        return list(self.sheets_manager.read_records(ENTRIES_RANGE))
+
+    def update_media(self, media_id: Any, updates: Dict[str, Any]) -> bool:
+        return self.update_media_many({media_id: updates})[media_id]
+
+    def update_media_many(self, updates: Dict[Any, Dict[str, Any]]) -> Dict[Any, bool]:
+        with self._index_lock:
+            if not self._ensure_row_index() and not self._index_matches(updates):
+                # Rows were inserted, deleted or sorted in the sheet since
+                # the index was built; writing now would hit the wrong cards
+                self._ensure_row_index(force=True)
+            found = {}
+            data = []
+            for media_id, changes in updates.items():
+                row_number = self._row_index.get(str(media_id))
+                found[media_id] = row_number is not None
+                if row_number is None:
+                    continue
+                # Only the columns being changed are written, one cell each
+                for column, value in changes.items():
+                    if column in self._headers:
+                        col = column_letter(self._headers.index(column))
+                        data.append({'range': f'media!{col}{row_number}', 'values': [[value]]})
+
+            self.sheets_manager.batch_update(data)
+
+            for media_id, changes in updates.items():
+                if found[media_id] and 'id' in changes and str(changes['id']) != str(media_id):
+                    self._row_index[str(changes['id'])] = self._row_index.pop(str(media_id))
+        return found
+
+    def _ensure_row_index(self, force: bool = False) -> bool:
+        """(Re)build the id -> row number index from the header row and the id column.
+
+        Returns True if it was just rebuilt.
+        """
+        # Caller holds self._index_lock
+        if (not force and self._index_loaded_at is not None
+                and time.monotonic() - self._index_loaded_at < MEDIA_ROW_INDEX_TTL):
+            return False
+        values = self.sheets_manager.read_values(['media!1:1', 'media!A2:A'])
+        self._headers = values['media!1:1'][0] if values['media!1:1'] else []
+        self._row_index = {}
+        for offset, row in enumerate(values['media!A2:A']):
+            if row and row[0] != '':
+                self._row_index.setdefault(str(row[0]), offset + 2)  # +2: 1-indexed, after header
+        self._index_loaded_at = time.monotonic()
+        return True
+
+    def _index_matches(self, updates: Dict[Any, Dict[str, Any]]) -> bool:
+        """Check the headers and the id cell of every row about to be written against the sheet"""
+        # Caller holds self._index_lock
+        if any(str(media_id) not in self._row_index for media_id in updates):
+            return False  # Possibly a card added by hand since the index was built
+        ranges = ['media!1:1'] + [f'media!A{self._row_index[str(media_id)]}' for media_id in updates]
+        values = self.sheets_manager.read_values(ranges, 'media!A:A')
+        if (values['media!1:1'][0] if values['media!1:1'] else []) != self._headers:
+            return False
+        for media_id, range_name in zip(updates, ranges[1:]):
+            cell = values[range_name]
+            if not cell or not cell[0] or str(cell[0][0]) != str(media_id):
+                return False
+        return True
+
+    def append_media(self, media_data: Dict[str, Any]) -> bool:
+        values = [
+            media_data.get('id', ''),
+            media_data.get('order', ''),
+            media_data.get('media_name', ''),
+            media_data.get('media_path', ''),
+            media_data.get('text', ''),
+            media_data.get('linkie', '')
+        ]
+        updates = self.sheets_manager.append_values('media!A:F', [values])
+        # Keep the row index current instead of invalidating it
+        row_number = first_row_of(updates.get('updatedRange', ''))
+        with self._index_lock:
+            if self._index_loaded_at is not None and row_number is not None and values[0] != '':
+                self._row_index.setdefault(str(values[0]), row_number)
+        return True
+
+    def append_entry(self, entry_data: Dict[str, Any]) -> bool:
+        values = [
+            entry_data.get('media_id', ''),
+            entry_data.get('entry_text', ''),
+            entry_data.get('timestamp', '')
+        ]
+        return self.sheets_manager.append_row('entries!A:C', values)
+
+
+class CsvStorage(StorageBackend):
+    """CSV files under data/, fully re-read and rewritten on every change"""
+
+    def __init__(self, media_path: str = 'data/media.csv', entries_path: str = 'data/entries.csv'):
+        self.media_path = media_path
+        self.entries_path = entries_path
+
+    def get_media(self) -> List[Dict[str, Any]]:
+        import pandas as pd  # Only the CSV mode needs pandas; keep it off the startup path
+        return pd.read_csv(self.media_path).to_dict('records')
+
+    def get_entries(self) -> List[Dict[str, Any]]:
+        import pandas as pd
+        return pd.read_csv(self.entries_path).to_dict('records')
+
+    def update_media(self, media_id: Any, updates: Dict[str, Any]) -> bool:
+        import pandas as pd
+        df = pd.read_csv(self.media_path)
+        mask = df['id'] == media_id
+        if not mask.any():
+            return False
+        for key, value in updates.items():
+            df.loc[mask, key] = value
+        df.to_csv(self.media_path, index=False)
+        return True
+
+    def append_media(self, media_data: Dict[str, Any]) -> bool:
+        return self._append(self.media_path, media_data)
+
+    def append_entry(self, entry_data: Dict[str, Any]) -> bool:
+        return self._append(self.entries_path, entry_data)
+
+    @staticmethod
+    def _append(path: str, row: Dict[str, Any]) -> bool:
+        import pandas as pd
+        df = pd.read_csv(path)
+        # DataFrame.append was removed in pandas 2.0
+        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        df.to_csv(path, index=False)
+        return True
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from operator import attrgetter, itemgetter
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from models.models import Media, Entry
+from .sheets_manager import SheetSnapshot, MEDIA_RANGE, ENTRIES_RANGE
+
+# How many past story-view versions ?since= deltas can be computed against
+STORY_VIEW_HISTORY = int(os.getenv('STORY_VIEW_HISTORY', '64'))
+
+# Fingerprints of those versions, shared by all workers so a ?since= poll
+# gets a delta whichever worker answers it
+STORY_VIEW_HISTORY_DIR = os.getenv('STORY_VIEW_HISTORY_DIR', os.path.join('data', 'story_view_history'))
+
+# Version tokens are hex digests joined by '-'; anything else is never a file name
+_TOKEN = re.compile(r'^[0-9a-f-]{1,128}$')
+
+
+def order_key(card: Media) -> float:
+    """Sort key for a card; cards without a numeric order go last"""
+    return card.order if card.order is not None else float('inf')
+
+
+def group_entries(entries: List[Entry]) -> Dict[str, List[Dict[str, Any]]]:
+    """Group entries by media_id in one pass, keeping sheet order within each card"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        # Blank messages (and rows without a card) are skipped
+        if not entry.entry_text or not entry.media_id:
+            continue
+        grouped.setdefault(entry.media_id, []).append({'entry_text': entry.entry_text})
+    return grouped
+
+
+def index_entries(entries: List[Entry]) -> Dict[str, List[Entry]]:
+    """Like group_entries, but keeping the records themselves (for the per-card entries endpoint)"""
+    indexed: Dict[str, List[Entry]] = {}
+    for entry in entries:
+        if not entry.entry_text or not entry.media_id:
+            continue
+        indexed.setdefault(entry.media_id, []).append(entry)
+    return indexed
+
+
+def position_index(items: List[Any], id_of: Callable[[Any], Any]) -> Dict[str, int]:
+    """Map each item id (as a string) to the position of the first item with it, for paginate()"""
+    positions: Dict[str, int] = {}
+    for position, item in enumerate(items):
+        positions.setdefault(str(id_of(item)), position)
+    return positions
+
+
+def paginate(items: List[Any], id_of: Callable[[Any], Any], cursor: Optional[str],
+             limit: int, positions: Optional[Dict[str, int]] = None) -> Tuple[List[Any], Optional[str]]:
+    """Return the page of items after the one whose id (id_of(item)) is cursor, and the next cursor.
+
+    Cursors are item ids rather than offsets, so pages stay put when items
+    are added elsewhere. positions is items' position_index(), if the caller
+    keeps one. Raises ValueError for a cursor that isn't in items.
+    """
+    start = 0
+    if cursor:
+        if positions is None:
+            positions = position_index(items, id_of)
+        position = positions.get(cursor)
+        if position is None:
+            raise ValueError(f"Unknown cursor: {cursor}")
+        start = position + 1
+    page = items[start:start + limit]
+    next_cursor = str(id_of(page[-1])) if page and start + limit < len(items) else None
+    return page, next_cursor
+
+
+def default_card_url(media_path: str) -> str:
+    return f"/api/cards/{media_path}"
+
+
+def build_story_view(cards: List[Media], entries: List[Entry],
+                     card_url: Callable[[str], str] = default_card_url) -> Dict[str, Any]:
+    """Build the /api/story-view payload: every card with its entries, sorted by order"""
+    entries_by_card = group_entries(entries)
+
+    cards_data = []
+    # sorted() is stable, so cards with the same order keep their sheet order
+    for card in sorted(cards, key=order_key):
+        # Skip if card doesn't have required fields
+        if not card.id or not card.media_path:
+            continue
+
+        cards_data.append({
+            'card_id': card.id,
+            'card_url': card_url(card.media_path),
+            'card_name': card.media_name,
+            'text': card.text,
+            'linkie': card.linkie,
+            # Clients have always been sent the order cell as written
+            'order': card.order_text,
+            'is_horizontal': card.is_horizontal,
+            'entries': entries_by_card.get(card.id, [])
+        })
+
+    return {'cards': cards_data}
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def fingerprint_story_view(payload: Dict[str, Any]) -> Dict[Any, Tuple[str, int, str]]:
+    """Summarize a payload as card_id -> (hash of card fields, entry count, hash of entries)"""
+    fingerprint = {}
+    for card in payload['cards']:
+        fields = {key: value for key, value in card.items() if key != 'entries'}
+        fingerprint[card['card_id']] = (_digest(fields), len(card['entries']), _digest(card['entries']))
+    return fingerprint
+
+
+def diff_story_view(old: Dict[Any, Tuple[str, int, str]], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the cards of payload that differ from the fingerprinted old payload.
+
+    A changed card is sent with all of its fields, but its 'entries' only hold
+    the entries from 'entries_offset' on: clients keep their first
+    entries_offset entries of the card and append these. Entries are normally
+    only added, so the offset is usually the old entry count; it is 0 when
+    earlier entries were edited or removed.
+    """
+    cards = []
+    for card in payload['cards']:
+        previous = old.get(card['card_id'])
+        fields = {key: value for key, value in card.items() if key != 'entries'}
+        entries = card['entries']
+        if previous is None:
+            offset = 0
+        elif len(entries) >= previous[1] and _digest(entries[:previous[1]]) == previous[2]:
+            offset = previous[1]
+        else:
+            offset = 0
+        if previous is not None and offset == len(entries) and _digest(fields) == previous[0]:
+            continue
+        changed = dict(fields)
+        changed['entries'] = entries[offset:]
+        changed['entries_offset'] = offset
+        cards.append(changed)
+
+    current_ids = {card['card_id'] for card in payload['cards']}
+    return {
+        'cards': cards,
+        'removed_card_ids': [card_id for card_id in old if card_id not in current_ids]
+    }
+
+
+class StoryView:
+    """Materialized story-view payload, rebuilt only when the sheet snapshot changes.
+
+    Payloads served under a version token are also fingerprinted (for the last
+    STORY_VIEW_HISTORY tokens) so changes_since() can answer ?since= requests
+    with just the cards that changed. Fingerprints are kept in memory and in
+    history_dir, where the other workers find them.
+    """
+
+    def __init__(self, card_url: Callable[[str], str] = default_card_url,
+                 history_dir: Optional[str] = STORY_VIEW_HISTORY_DIR):
+        self.card_url = card_url
+        self.history_dir = history_dir
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._payload: Optional[Dict[str, Any]] = None
+        self._index: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        # Cursor lookups for paginate(), built once per version
+        self._card_positions: Optional[Dict[str, int]] = None
+        self._entry_positions: Dict[str, Dict[str, int]] = {}
+        # Payload lookups served from the last build / rebuilt
+        self.hits = 0
+        self.misses = 0
+        self._history: 'OrderedDict[str, Dict[Any, Tuple[str, int, str]]]' = OrderedDict()
+        self._deltas: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+
+    def get(self, snapshot: SheetSnapshot, token: Optional[str] = None) -> Dict[str, Any]:
+        """Return the payload for snapshot, reusing the last one if the data hasn't changed.
+
+        With a token, the payload is remembered as that version for changes_since().
+        """
+        with self._lock:
+            cached = self._payload if self._version == snapshot.version else None
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            payload = cached
+        else:
+            payload = build_story_view(snapshot.records[MEDIA_RANGE], snapshot.records[ENTRIES_RANGE], self.card_url)
+            with self._lock:
+                self._version = snapshot.version
+                self._payload = payload
+                self._index = None
+                self._card_positions = None
+                self._entry_positions = {}
+        if token is not None:
+            self._remember(token, payload)
+        return payload
+
+    def entries_by_card(self, snapshot: SheetSnapshot) -> Dict[str, List[Entry]]:
+        """Return snapshot's entry records grouped by card id, built once per version"""
+        payload = self.get(snapshot)
+        with self._lock:
+            if self._version == snapshot.version and self._index is not None:
+                return self._index
+        index = index_entries(snapshot.records[ENTRIES_RANGE])
+        with self._lock:
+            if self._payload is payload:
+                self._index = index
+        return index
+
+    def card_positions(self, snapshot: SheetSnapshot) -> Dict[str, int]:
+        """Return the position_index() of the payload's cards by card_id, built once per version"""
+        payload = self.get(snapshot)
+        with self._lock:
+            if self._payload is payload and self._card_positions is not None:
+                return self._card_positions
+        positions = position_index(payload['cards'], itemgetter('card_id'))
+        with self._lock:
+            if self._payload is payload:
+                self._card_positions = positions
+        return positions
+
+    def entry_positions(self, snapshot: SheetSnapshot, card_id: str) -> Dict[str, int]:
+        """Return the position_index() of one card's entries (entries_by_card) by id, built once per version"""
+        entries = self.entries_by_card(snapshot).get(card_id, [])
+        with self._lock:
+            if self._version == snapshot.version and card_id in self._entry_positions:
+                return self._entry_positions[card_id]
+        positions = position_index(entries, attrgetter('id'))
+        with self._lock:
+            if self._version == snapshot.version:
+                self._entry_positions[card_id] = positions
+        return positions
+
+    def changes_since(self, since: str, snapshot: SheetSnapshot, token: str) -> Optional[Dict[str, Any]]:
+        """Return what changed between version since and snapshot (served as token).
+
+        Returns None if since is not a version any worker remembers; the
+        caller should then send the full payload.
+        """
+        payload = self.get(snapshot, token)
+        with self._lock:
+            old = self._history.get(since)
+            delta = self._deltas.get((since, token))
+        if old is None:
+            old = self._load_shared(since)
+            if old is None:
+                return None
+            with self._lock:
+                self._history[since] = old
+                while len(self._history) > STORY_VIEW_HISTORY:
+                    self._history.popitem(last=False)
+        if delta is None:
+            delta = {'version': token, 'since': since, **diff_story_view(old, payload)}
+            with self._lock:
+                self._deltas[(since, token)] = delta
+                while len(self._deltas) > STORY_VIEW_HISTORY:
+                    self._deltas.popitem(last=False)
+        return delta
+
+    def _remember(self, token: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            if token in self._history:
+                self._history.move_to_end(token)
+                return
+        fingerprint = fingerprint_story_view(payload)
+        with self._lock:
+            self._history[token] = fingerprint
+            while len(self._history) > STORY_VIEW_HISTORY:
+                self._history.popitem(last=False)
+        self._save_shared(token, fingerprint)
+
+    def _shared_path(self, token: str) -> Optional[str]:
+        if self.history_dir is None or not _TOKEN.match(token):
+            return None
+        return os.path.join(self.history_dir, f'{token}.json')
+
+    def _load_shared(self, token: str) -> Optional[Dict[Any, Tuple[str, int, str]]]:
+        path = self._shared_path(token)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return {card_id: tuple(value) for card_id, value in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return None
+
+    def _save_shared(self, token: str, fingerprint: Dict[Any, Tuple[str, int, str]]) -> None:
+        path = self._shared_path(token)
+        if path is None or os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.history_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            # Keep the newest STORY_VIEW_HISTORY versions
+            names = [name for name in os.listdir(self.history_dir) if name.endswith('.json')]
+            if len(names) > STORY_VIEW_HISTORY:
+                paths = sorted((os.path.join(self.history_dir, name) for name in names), key=os.path.getmtime)
+                for old_path in paths[:-STORY_VIEW_HISTORY]:
+                    os.remove(old_path)
+        except OSError:
+            pass  # Another worker pruned the same file; deltas are an optimization
@@ -1,20 +1,197 @@
-from dataclasses import dataclass
+import numbers
+import sys
 import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+def parse_order(value: Any) -> Optional[int]:
+    """Convert a card's order cell to an int (None if it isn't a whole number)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # pandas reads whole-number columns with blanks as floats
+    if isinstance(value, str) and value.isdecimal():
+        return int(value)  # isdigit() would also accept '²', which int() rejects
+    return None
+
+
+def parse_is_horizontal(value: Any) -> bool:
+    """Convert is_horizontal to boolean - handle both string and integer values"""
+    try:
+        if isinstance(value, str):
+            return value.lower() in ['1', 'true', 'yes']
+        elif isinstance(value, (int, float)):
+            return bool(int(value))
+        else:
+            return bool(value)
+    except Exception:
+        return False
+
+
+def _intern(value: Any) -> str:
+    # Ids repeat across rows (every entry names its card), so share one string per id
+    return sys.intern(value if isinstance(value, str) else str(value))
+
+
+def _order_text(value: Any) -> str:
+    # The cell as written; backends with a typed column may give an int or None
+    return '' if value is None else str(value)
 
 
-@dataclass
 class Media:
-    id: str = str(uuid.uuid4())
-    media_name: str = ""
-    media_path: str = ""
-    text: str = ""
-    linkie: str = ""
-    order: int = 0  # Position in the sequence, default to 0
-    is_horizontal: bool = 0 
+    """A card (a row of the media sheet), with order and is_horizontal already parsed.
+
+    order_text keeps the order cell as written, which is what clients are sent.
+
+    Records built from sheet data are shared by every request and must be
+    treated as read-only.
+    """
+
+    __slots__ = ('id', 'media_name', 'media_path', 'text', 'linkie', 'order', 'order_text', 'is_horizontal')
+    # Fields holding the cell text unchanged (order and is_horizontal are parsed)
+    RAW_FIELDS = frozenset(('id', 'media_name', 'media_path', 'text', 'linkie'))
+
+    def __init__(self, id: Optional[str] = None, media_name: str = "", media_path: str = "",
+                 text: str = "", linkie: str = "", order: Optional[int] = None, is_horizontal: bool = False,
+                 order_text: Optional[str] = None):
+        # A fresh id per record (a default argument would be shared by all of them)
+        self.id: str = id if id is not None else str(uuid.uuid4())
+        self.media_name = media_name
+        self.media_path = media_path
+        self.text = text
+        self.linkie = linkie
+        self.order = order  # Position in the sequence; None sorts last
+        self.order_text = order_text if order_text is not None else ('' if order is None else str(order))
+        self.is_horizontal = is_horizontal
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'Media':
+        """Build a record from a sheet row dict (missing cells are empty)"""
+        return cls(
+            id=_intern(row.get('id', '')),
+            media_name=row.get('media_name', ''),
+            media_path=row.get('media_path', ''),
+            text=row.get('text', ''),
+            linkie=row.get('linkie', ''),
+            order=parse_order(row.get('order', '')),
+            is_horizontal=parse_is_horizontal(row.get('is_horizontal', False)),
+            order_text=_order_text(row.get('order'))
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Media) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Media(id={self.id!r}, media_path={self.media_path!r}, order={self.order!r})"
 
 
-@dataclass
 class Entry:
-    media_id: str               
-    entry_text: str = ""
-    id: str = str(uuid.uuid4())
+    """A message left on a card (a row of the entries sheet).
+
+    Records built from sheet data are shared by every request and must be
+    treated as read-only.
+    """
+
+    __slots__ = ('media_id', 'entry_text', 'id', 'timestamp')
+    # Fields holding the cell text unchanged
+    RAW_FIELDS = frozenset(__slots__)
+
+    def __init__(self, media_id: str, entry_text: str = "", id: Optional[str] = None, timestamp: str = ""):
+        self.media_id = media_id
+        self.entry_text = entry_text
+        self.id: str = id if id is not None else str(uuid.uuid4())
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'Entry':
+        """Build a record from a sheet row dict (missing cells are empty)"""
+        return cls(
+            media_id=_intern(row.get('media_id', '')),
+            entry_text=row.get('entry_text', ''),
+            id=_intern(row.get('id', '')),
+            timestamp=row.get('timestamp', '') or ''
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Entry) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Entry(id={self.id!r}, media_id={self.media_id!r})"
+
+
+# Record type of each sheet that has one, by sheet name
+RECORD_TYPES = {'media': Media, 'entries': Entry}
+
+
+def parse_records(sheet_name: str, rows: List[Dict[str, Any]]) -> Optional[List[Any]]:
+    """Turn a sheet's row dicts into records, or return None for a sheet without a record type"""
+    record_type = RECORD_TYPES.get(sheet_name)
+    if record_type is None:
+        return None
+    records = [record_type.from_row(row) for row in rows]
+    # Point the rows at the interned ids too, so each id string is stored once
+    for row, record in zip(rows, records):
+        for name in ('id', 'media_id'):
+            if name in row and isinstance(row[name], str):
+                row[name] = getattr(record, name)
+    return records
+
+
+class RecordRows(Sequence):
+    """A sheet's row dicts, rebuilt on demand from records that keep every cell.
+
+    Stands in for the list of row dicts of a range whose headers are all raw
+    fields of its record type (see record_rows), so only the records stay in
+    memory. Every access builds fresh dicts; like the Sheets API, a row leaves
+    out its trailing empty cells.
+    """
+
+    __slots__ = ('record_type', 'records', 'headers')
+
+    def __init__(self, record_type: type, records: List[Any], headers: List[str]):
+        self.record_type = record_type
+        self.records = records
+        self.headers = headers
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RecordRows(self.record_type, self.records[index], self.headers)
+        return self._row(self.records[index])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return map(self._row, self.records)
+
+    def __add__(self, other: Sequence[Dict[str, Any]]) -> 'RecordRows':
+        """Append rows, parsing only the ones that aren't records already"""
+        if isinstance(other, RecordRows) and other.record_type is self.record_type and other.headers == self.headers:
+            records = other.records
+        else:
+            records = [self.record_type.from_row(row) for row in other]
+        return RecordRows(self.record_type, self.records + records, self.headers)
+
+    def _row(self, record: Any) -> Dict[str, Any]:
+        values = [getattr(record, name) for name in self.headers]
+        while values and values[-1] == '':
+            values.pop()
+        return dict(zip(self.headers, values))
+
+
+def record_rows(sheet_name: str, records: Optional[List[Any]], headers: List[str]) -> Optional[RecordRows]:
+    """Return the rows as a RecordRows over records, or None if the records don't keep every cell"""
+    record_type = RECORD_TYPES.get(sheet_name)
+    if record_type is None or records is None or not headers or len(set(headers)) != len(headers):
+        return None
+    if not record_type.RAW_FIELDS.issuperset(headers):
+        return None
+    return RecordRows(record_type, records, headers)
@@ -1,19 +1,135 @@
-from flask import jsonify, request, send_file, Blueprint
+from flask import jsonify, request, send_file, Blueprint, Response, g
 import datetime
 import os
+import time
+from operator import attrgetter, itemgetter
 from pathlib import Path
 from models.models import Entry
 from database import data_manager  # We'll create this instance in app.py
-from database.sheets_manager import GoogleSheetsManager
+from database.sheets_manager import GoogleSheetsManager, MEDIA_RANGE, ENTRIES_RANGE, CARDS_RANGE
+from database.sheets_scheduler import SheetsBusyError
+from database.story_view import StoryView, paginate
+from database.entry_queue import EntryQueue
+from routes.http_cache import not_modified, with_validators
+from routes.response_cache import ResponseCache, send_cached, weaken_etag
+from services.asset_manifest import AssetManifest
+from services.card_variants import CardVariantCache
+from services.entry_stream import EntryStream
+from services.export import export_lines, EXPORT_KINDS
+from services import metrics, profiling
+from services.profiling import phase
 import uuid
-import pandas as pd
 
 # Create the blueprint here instead
 api = Blueprint('api', __name__, url_prefix='/api')
 
+# Server-Timing phases on every response, cProfile dumps for sampled requests
+profiling.install(api)
+
 # Initialize sheets manager
 sheets_manager = GoogleSheetsManager()
 
+# Index of assets/birthday_cards (size, mtime, content hash), built once at startup
+asset_manifest = AssetManifest()
+asset_manifest.build()
+
+# Story-view payload, materialized once per sheet snapshot
+story_view = StoryView(card_url=asset_manifest.url_for)
+
+# New entries are logged locally and appended to the sheet in batches
+entry_queue = EntryQueue(sheets_manager)
+# Replay entries left behind by crashed workers now, not on the next submit
+entry_queue.start()
+
+# Resized/re-encoded card images (?w=480&fmt=webp), kept on disk
+card_variants = CardVariantCache()
+
+# Live feed of accepted entries for /api/entries/stream
+entry_stream = EntryStream()
+
+# Serialized (and compressed) /cards and /story-view bodies, per data version
+response_cache = ResponseCache()
+
+# Paginated /story-view bodies; kept apart so clients paging (or sending
+# made-up cursors) can't push the full bodies out of response_cache
+page_cache = ResponseCache(max_entries=int(os.getenv('STORY_VIEW_PAGE_CACHE_ENTRIES', '64')))
+
+
+def _collect_metrics():
+    """Scrape-time samples: cache hit/miss counts, Sheets quota lanes and queue sizes"""
+    sf = sheets_manager.single_flight.stats()
+    samples = (
+        metrics.cache_samples('sheets', sheets_manager.cache.hits, sheets_manager.cache.misses,
+                              sheets_manager.cache.stale_hits)
+        + metrics.cache_samples('sheets_shared', sheets_manager.shared_hits, sheets_manager.shared_misses)
+        + metrics.cache_samples('sheets_single_flight', sf['coalesced'], sf['loads'])
+        + metrics.cache_samples('story_view', story_view.hits, story_view.misses)
+        + metrics.cache_samples('response', response_cache.hits, response_cache.misses)
+        + metrics.cache_samples('story_view_pages', page_cache.hits, page_cache.misses)
+        + metrics.cache_samples('card_variants', card_variants.hits, card_variants.misses)
+    )
+    for lane, stats in sheets_manager.scheduler.stats().items():
+        labels = {'lane': lane}
+        samples += [
+            ('isee_sheets_queue_depth', 'gauge', 'Sheets requests waiting for quota', labels, stats['queued']),
+            ('isee_sheets_throttled_total', 'counter', 'Sheets requests that waited for quota', labels, stats['throttled']),
+            ('isee_sheets_shed_total', 'counter', 'Sheets requests shed after their deadline', labels, stats['shed']),
+            ('isee_sheets_retries_total', 'counter', 'Sheets request retries', labels, stats['retries']),
+        ]
+    samples += [
+        ('isee_entry_queue_pending', 'gauge', 'Entries accepted but not yet in the sheet', {}, len(entry_queue.pending())),
+        ('isee_entry_stream_clients', 'gauge', 'Connected /entries/stream clients', {}, entry_stream.client_count()),
+    ]
+    return samples
+
+
+metrics.registry.add_collector(_collect_metrics)
+metrics.registry.start()
+
+# Cache lifetime for resized card images requested without a fingerprint (seconds)
+CARD_VARIANT_MAX_AGE = int(os.environ.get('CARD_VARIANT_MAX_AGE', 7 * 24 * 3600))
+
+# Cache lifetime for fingerprinted (?v=<digest>) card URLs
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Page sizes for /cards/<id>/entries and paginated /story-view
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _busy():
+    # Shed by the Sheets scheduler: over quota, so ask the client to come back
+    response = jsonify({'error': 'Service busy, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+def _page_args():
+    """Read limit/cursor query arguments, returning (limit, cursor) or raising ValueError"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1:
+        raise ValueError("limit must be a positive number")
+    return min(limit, MAX_PAGE_SIZE), request.args.get('cursor')
+
+
+def _etag(snapshot) -> str:
+    # Responses embed fingerprinted card URLs, so a new card file is a new version too
+    return f"{snapshot.version}-{asset_manifest.version[:12]}"
+
+@api.before_request
+def start_timer():
+    g.request_started = time.monotonic()
+
+@api.after_request
+def record_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(time.monotonic() - started, route=route,
+                                              method=request.method, status=response.status_code)
+    return response
+
 @api.route('/createentry', methods=['POST'])
 def create_entry():
     data = request.get_json()
@@ -35,8 +151,9 @@ def create_entry():
     entry_data = [entry_id, media_id, entry_text]
     
     try:
-        # Write to the entries sheet using append_row (not append_rows)
-        sheets_manager.append_row('entries!A:C', entry_data)
+        # Durably queue the row; a background flusher appends it to the entries sheet
+        with phase('queue'):
+            entry_queue.submit(entry_data)
         
         response = {
             "message": "Entry saved successfully",
@@ -45,24 +162,109 @@ def create_entry():
             "entry_text": entry_text,
             "timestamp": datetime.datetime.now().isoformat()
         }
+        try:
+            with phase('publish'):
+                entry_stream.publish({key: response[key] for key in ('entry_id', 'media_id', 'entry_text', 'timestamp')})
+        except OSError as e:
+            # The entry is saved either way; live viewers see it on their next reload
+            print(f"Error publishing entry to stream: {e}")
         return jsonify(response), 201
         
     except Exception as e:
         print(f"Error saving entry: {e}")
         return jsonify({"error": "Failed to save entry"}), 500
 
+@api.route('/entries/stream')
+def stream_entries():
+    """Server-Sent Events stream of entries as they are created ('entry' events).
+
+    Reconnecting clients send Last-Event-ID and get what they missed, or a
+    'reset' event when they should reload /api/story-view instead.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        events = entry_stream.stream(last_event_id)
+        first = next(events)  # Registers the client now, so a full worker can say so
+    except OverflowError:
+        return jsonify({'error': 'Too many stream clients, try again later'}), 503
+
+    def generate():
+        yield first
+        yield from events
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let proxies buffer the stream
+    return response
+
+@api.route('/cards/<card_id>/entries')
+def get_card_entries(card_id):
+    """Entries of one card, oldest first, a page at a time (?limit=&cursor=<entry_id>)"""
+    try:
+        limit, cursor = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with phase('fetch'):
+            snapshot = entry_queue.overlay(sheets_manager.read_snapshot([ENTRIES_RANGE, MEDIA_RANGE]))
+        if not any(card.id == card_id for card in snapshot.records[MEDIA_RANGE]):
+            return jsonify({'error': 'Card not found'}), 404
+        etag = _etag(snapshot)
+        cached = not_modified(etag, snapshot.last_modified)
+        if cached is not None:
+            return cached
+        
+        with phase('transform'):
+            entries = story_view.entries_by_card(snapshot).get(card_id, [])
+            try:
+                page, next_cursor = paginate(entries, attrgetter('id'), cursor, limit,
+                                             story_view.entry_positions(snapshot, card_id))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        response = jsonify({
+            'card_id': card_id,
+            'entries': [{'entry_id': entry.id, 'entry_text': entry.entry_text} for entry in page],
+            'entry_count': len(entries),
+            'next_cursor': next_cursor,
+            'version': etag
+        })
+        return with_validators(response, etag, snapshot.last_modified)
+    except SheetsBusyError:
+        return _busy()
+    except Exception as e:
+        print(f"Error getting entries of card {card_id}: {e}")
+        return jsonify({'error': 'Could not fetch entries'}), 500
+
 @api.route('/cards/<path:filename>')
 def serve_card(filename):
-    """Serve individual card images"""
-    cards_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'birthday_cards')
-    full_path = os.path.join(cards_directory, filename)
-
+    """Serve individual card images, optionally resized (?w=) and re-encoded (?fmt=)"""
     try:
-        if os.path.exists(full_path):
-            return send_file(full_path)
-        else:
-            print(f"File not found: {full_path}")
+        asset = asset_manifest.get(filename)
+        if asset is None:
+            print(f"File not found: {filename}")
             return jsonify({'error': 'Image not found'}), 404
+
+        width, fmt = card_variants.normalize(request.args.get('w', type=int), request.args.get('fmt'))
+        if width or fmt:
+            path = card_variants.get(asset, width, fmt)
+            etag = f"{asset.digest}-{width or 0}-{fmt or 'orig'}"
+            max_age = CARD_VARIANT_MAX_AGE
+        else:
+            path = asset.path
+            etag = asset.digest
+            max_age = None
+
+        # conditional=True answers Range and If-None-Match/If-Modified-Since requests
+        response = send_file(path, conditional=True, etag=etag,
+                             last_modified=asset.mtime, max_age=max_age)
+        if request.args.get('v') == asset.digest:
+            # The fingerprint pins the content, so this URL can never change
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        if response.cache_control.max_age:
+            response.cache_control.public = True
+        return response
     except Exception as e:
         print(f"Error serving image: {e}")
         return jsonify({'error': 'Image not found'}), 404
@@ -72,87 +274,142 @@ def get_card_urls():
     """Get list of all cards with their complete information"""
     try:
         # Get cards from Google Sheets
-        cards_list = sheets_manager.read_sheet('media!A1:F')
+        with phase('fetch'):
+            snapshot = sheets_manager.read_snapshot([CARDS_RANGE])
+        etag = _etag(snapshot)
+        cached = not_modified(etag, snapshot.last_modified)
+        if cached is not None:
+            return cached
         
-        # Add the full URL path for each card
-        for card in cards_list:
-            if 'media_path' in card:
-                card['url'] = f"/api/cards/{card['media_path']}"
+        def build():
+            # Add the full (fingerprinted) URL path for each card
+            cards_list = [dict(card) for card in snapshot.data[CARDS_RANGE]]
+            for card in cards_list:
+                if 'media_path' in card:
+                    card['url'] = asset_manifest.url_for(card['media_path'])
+            return cards_list
         
-        return jsonify(cards_list)
+        # Serialized and compressed once per version
+        response = send_cached(response_cache.get(('cards', etag), build))
+        return weaken_etag(with_validators(response, etag, snapshot.last_modified))
+    except SheetsBusyError:
+        return _busy()
     except Exception as e:
         print(f"Error getting cards: {e}")
         return jsonify({'error': 'Could not fetch cards'}), 500
 
 @api.route('/story-view')
 def get_story_view():
-    """Get cards with their associated entries"""
+    """Get cards with their associated entries.
+
+    Every payload carries a 'version'; ?since=<version> returns only the cards
+    that changed after it (see StoryView.changes_since), or the full payload
+    with 'full': true if that version is unknown (or too old).
+
+    ?limit=&cursor=<card_id> return the cards a page at a time (with a
+    'next_cursor'), and ?entries=count replaces each card's entries with an
+    'entry_count' so they can be loaded from /cards/<id>/entries instead.
+    """
     try:
-        # Get data from Google Sheets
-        entries = sheets_manager.read_sheet('entries!A1:C')
-        cards = sheets_manager.read_sheet('media!A1:G')  # Extended to include column G for is_horizontal
+        with phase('fetch'):
+            # Get data from Google Sheets in a single round trip
+            # (media is extended to column G for is_horizontal)
+            snapshot = sheets_manager.read_snapshot([ENTRIES_RANGE, MEDIA_RANGE])
+            # Entries accepted but not flushed yet are shown right away
+            snapshot = entry_queue.overlay(snapshot)
+        etag = _etag(snapshot)
         
-        # Create response with all cards
-        cards_data = []
+        since = request.args.get('since')
+        if since:
+            with phase('transform'):
+                delta = story_view.changes_since(since, snapshot, etag)
+            if delta is not None:
+                response = jsonify(delta)
+                response.cache_control.no_store = True
+                return response
         
-        # Create DataFrame directly from the entries list of dictionaries
-        entries_df = None
-        if entries:
-            try:
-                entries_df = pd.DataFrame(entries)
-            except Exception as df_error:
-                print(f"Error creating DataFrame: {df_error}")
-                entries_df = None
+        cached = not_modified(etag, snapshot.last_modified)
+        if cached is not None:
+            return cached
         
-        for card in cards:
-            # Skip if card doesn't have required fields
-            if 'id' not in card or 'media_path' not in card:
-                continue
-                
-            # For each card, find its entries if any exist
-            card_entries = []
-            if entries_df is not None:
-                try:
-                    matching_entries = entries_df[entries_df['media_id'] == card['id']]
-                    card_entries = [{'entry_text': row['entry_text']} 
-                                  for _, row in matching_entries.iterrows() 
-                                  if 'entry_text' in row]
-                except Exception as entry_error:
-                    print(f"Error processing entries for card {card['id']}: {entry_error}")
-                    card_entries = []
-            
-            # Convert is_horizontal to boolean - handle both string and integer values
+        paged = 'limit' in request.args or 'cursor' in request.args
+        counts_only = request.args.get('entries') == 'count'
+        if paged or counts_only:
             try:
-                is_horizontal = card.get('is_horizontal', False)
-                if isinstance(is_horizontal, str):
-                    is_horizontal = is_horizontal.lower() in ['1', 'true', 'yes']
-                elif isinstance(is_horizontal, (int, float)):
-                    is_horizontal = bool(int(is_horizontal))
-                else:
-                    is_horizontal = bool(is_horizontal)
-            except Exception:
-                is_horizontal = False
+                limit, cursor = _page_args() if paged else (None, None)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            def build_page():
+                cards = story_view.get(snapshot, etag)['cards']
+                next_cursor = None
+                if paged:
+                    cards, next_cursor = paginate(cards, itemgetter('card_id'), cursor, limit,
+                                                  story_view.card_positions(snapshot))
+                if counts_only:
+                    cards = [
+                        {**{key: value for key, value in card.items() if key != 'entries'},
+                         'entry_count': len(card['entries'])}
+                        for card in cards
+                    ]
+                return {'cards': cards, 'next_cursor': next_cursor, 'version': etag}
             
-            card_data = {
-                'card_id': card['id'],
-                'card_url': f"/api/cards/{card['media_path']}",
-                'card_name': card.get('media_name', ''),
-                'text': card.get('text', ''),
-                'linkie': card.get('linkie', ''),
-                'order': card.get('order', ''),
-                'is_horizontal': is_horizontal,
-                'entries': card_entries
-            }
-            cards_data.append(card_data)
+            try:
+                body = page_cache.get(('story-view-page', etag, limit, cursor, counts_only), build_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return weaken_etag(with_validators(send_cached(body), etag, snapshot.last_modified))
         
-        # Sort by order if it exists, with error handling
-        try:
-            cards_data.sort(key=lambda x: int(x['order']) if x['order'] and x['order'].isdigit() else float('inf'))
-        except Exception as sort_error:
-            print(f"Error sorting cards: {sort_error}")
+        def build():
+            # Entries are grouped and cards sorted only when the snapshot changes
+            payload = dict(story_view.get(snapshot, etag), version=etag)
+            if since:
+                payload['full'] = True
+            return payload
         
-        return jsonify({'cards': cards_data})
+        # Serialized and compressed once per version
+        response = send_cached(response_cache.get(('story-view', etag, bool(since)), build))
+        return weaken_etag(with_validators(response, etag, snapshot.last_modified))
+    except SheetsBusyError:
+        return _busy()
     except Exception as e:
         print(f"Error in get_story_view: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@api.route('/export')
+def export():
+    """Every card, then every entry, streamed as NDJSON (one JSON object per line).
+
+    ?only=cards or ?only=entries limits the export to one kind.
+    """
+    only = request.args.get('only')
+    if only is not None and only not in EXPORT_KINDS:
+        return jsonify({'error': f"only must be one of {', '.join(EXPORT_KINDS)}"}), 400
+    try:
+        with phase('fetch'):
+            snapshot = entry_queue.overlay(sheets_manager.read_snapshot([ENTRIES_RANGE, MEDIA_RANGE]))
+    except SheetsBusyError:
+        return _busy()
+    except Exception as e:
+        print(f"Error exporting: {e}")
+        return jsonify({'error': 'Could not export'}), 500
+    
+    # Lines are generated as the response is sent, never all held at once
+    lines = export_lines({'cards': snapshot.data[MEDIA_RANGE], 'entries': snapshot.data[ENTRIES_RANGE]}, only)
+    response = Response(lines, mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename="isee-export.ndjson"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.cache_control.no_store = True
+    return response
+
+@api.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint: route latency, Sheets calls and cache hit ratios of every worker"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/sheets/stats')
+def sheets_stats():
+    """Sheets request state: per-lane queue depth, tokens and throttle counters, and read coalescing"""
+    return jsonify({
+        'lanes': sheets_manager.scheduler.stats(),
+        'single_flight': sheets_manager.single_flight.stats()
+    })
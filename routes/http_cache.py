@@ -0,0 +1,32 @@
+import datetime
+from typing import Optional
+from flask import Response, request
+
+
+def _http_date(timestamp: float) -> datetime.datetime:
+    # HTTP dates have one-second resolution
+    return datetime.datetime.fromtimestamp(int(timestamp), tz=datetime.timezone.utc)
+
+
+def not_modified(etag: str, last_modified: float) -> Optional[Response]:
+    """Return a 304 response if the request's validators still match, else None"""
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since is not None:
+        matched = _http_date(last_modified) <= request.if_modified_since
+    else:
+        matched = False
+
+    if not matched:
+        return None
+    response = Response(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response: Response, etag: str, last_modified: float) -> Response:
+    """Tag response with its ETag/Last-Modified and ask clients to revalidate before reuse"""
+    response.set_etag(etag)
+    response.last_modified = _http_date(last_modified)
+    response.cache_control.no_cache = True
+    return response
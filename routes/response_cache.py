@@ -0,0 +1,109 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+from flask import Response, current_app, request
+from services.profiling import phase
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+# Number of serialized responses kept (each is one payload version)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '16'))
+
+# Bodies smaller than this aren't worth compressing (bytes)
+COMPRESS_MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedBody:
+    """A JSON body serialized once, plus its compressed encodings made on first use"""
+
+    __slots__ = ('data', '_encoded', '_lock')
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """Return the body in 'br', 'gzip' or 'identity' encoding"""
+        if encoding == 'identity':
+            return self.data
+        with self._lock:
+            body = self._encoded.get(encoding)
+            if body is None:
+                if encoding == 'br':
+                    body = brotli.compress(self.data, quality=BROTLI_QUALITY)
+                else:
+                    body = gzip.compress(self.data, compresslevel=GZIP_LEVEL, mtime=0)
+                self._encoded[encoding] = body
+            return body
+
+
+class ResponseCache:
+    """Serialized JSON responses keyed by data version, so unchanged payloads are never re-encoded"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._bodies: 'OrderedDict[Hashable, CachedBody]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> CachedBody:
+        """Return the cached body for key, serializing build()'s payload on a miss"""
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+        with phase('transform'):
+            payload = build()
+        with phase('serialize'):
+            # Same bytes jsonify would produce
+            body = CachedBody(f"{current_app.json.dumps(payload)}\n".encode())
+        with self._lock:
+            self._bodies[key] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        return body
+
+
+def negotiate_encoding(size: int) -> str:
+    """Pick the best encoding the client accepts for a body of this size"""
+    if size < COMPRESS_MIN_SIZE:
+        return 'identity'
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+
+def send_cached(body: CachedBody, status: int = 200) -> Response:
+    """Build a JSON response from a cached body in the encoding the client prefers"""
+    encoding = negotiate_encoding(len(body.data))
+    with phase('compress'):
+        data = body.encoded(encoding)
+    response = Response(data, status=status, mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def weaken_etag(response: Response) -> Response:
+    """Compressed bodies aren't byte-identical to the plain one, so their ETag must be weak"""
+    etag, weak = response.get_etag()
+    if etag and not weak and 'Content-Encoding' in response.headers:
+        response.set_etag(etag, weak=True)
+    return response
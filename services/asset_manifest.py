@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+CARDS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'birthday_cards')
+
+# Digests from the previous start, reused for files whose size and mtime are unchanged
+ASSET_MANIFEST_CACHE = os.path.join('data', 'asset_manifest.json')
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AssetEntry:
+    """One file in the card assets directory"""
+    name: str
+    path: str
+    size: int
+    mtime: float
+    digest: str  # Short content hash, used as the URL fingerprint and ETag
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class AssetManifest:
+    """In-memory index of the card assets, built once at startup.
+
+    Card URLs carry the file's content hash (/api/cards/<name>?v=<digest>), so
+    a fingerprinted URL always points at the same bytes and can be cached as
+    immutable.
+    """
+
+    def __init__(self, directory: str = CARDS_DIR, cache_path: str = ASSET_MANIFEST_CACHE):
+        self.directory = directory
+        self.cache_path = cache_path
+        self.version = ''
+        self._entries: Dict[str, AssetEntry] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> None:
+        """Scan the assets directory, hashing only files that changed since the last start"""
+        previous = self._load_cache()
+        entries: Dict[str, AssetEntry] = {}
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                    entry = self._entry_for(name, path, previous.get(name))
+                    if entry is not None:
+                        entries[name] = entry
+
+        version = hashlib.sha1()
+        for name in sorted(entries):
+            version.update(f'{name}={entries[name].digest};'.encode())
+        with self._lock:
+            self._entries = entries
+            self.version = version.hexdigest()
+        self._save_cache(entries)
+        logger.info(f"Asset manifest built: {len(entries)} files")
+
+    def get(self, name: str) -> Optional[AssetEntry]:
+        """Look up a file by its name relative to the assets directory.
+
+        Answered from the index alone, so a request for a missing file never
+        touches the disk; files added since the last build() aren't served
+        until build() runs again (every start does).
+        """
+        return self._entries.get(name)
+
+    def url_for(self, name: str) -> str:
+        """Fingerprinted URL for an asset (plain URL if the file isn't known)"""
+        url = f"/api/cards/{name}"
+        entry = self._entries.get(name)
+        return f"{url}?v={entry.digest}" if entry is not None else url
+
+    @staticmethod
+    def _entry_for(name: str, path: str, cached: Optional[dict]) -> Optional[AssetEntry]:
+        try:
+            stat = os.stat(path)
+            if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+                digest = cached['digest']
+            else:
+                digest = _file_digest(path)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable asset {path}: {e}")
+            return None
+        return AssetEntry(name=name, path=path, size=stat.st_size, mtime=stat.st_mtime, digest=digest)
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, entries: Dict[str, AssetEntry]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({name: asdict(entry) for name, entry in entries.items()}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not save asset manifest cache: {e}")
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+from .asset_manifest import AssetEntry, AssetManifest
+from .cooperative import run_blocking
+
+CARD_VARIANTS_DIR = os.path.join('data', 'card_variants')
+
+# Upper bound for the on-disk variant cache; least recently served files go first
+CARD_VARIANT_CACHE_MAX_BYTES = int(os.getenv('CARD_VARIANT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Requested widths are rounded up to one of these so the cache stays small
+VARIANT_WIDTHS = (240, 480, 720, 960, 1440, 1920)
+
+# Sizes/formats pregenerated by the warm-up command
+WARM_WIDTHS = [int(w) for w in os.getenv('CARD_VARIANT_WARM_WIDTHS', '480,960').split(',')]
+WARM_FORMATS = os.getenv('CARD_VARIANT_WARM_FORMATS', 'webp').split(',')
+
+# fmt query value -> (Pillow format, file extension, save options)
+VARIANT_FORMATS: Dict[str, Tuple[str, str, dict]] = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'jpg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'png', {'optimize': True}),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def variant_width(width: int) -> int:
+    """Round a requested width up to the nearest supported variant width"""
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+class CardVariantCache:
+    """Resized / re-encoded card images, generated on first request and kept on disk.
+
+    Variant files are named after a hash of the source file's content digest
+    and the requested width/format, so editing a card produces new variants and
+    the old ones simply age out of the cache.
+    """
+
+    def __init__(self, cache_dir: str = CARD_VARIANTS_DIR, max_bytes: int = CARD_VARIANT_CACHE_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._pillow_missing = False
+        # Variant paths whose source already fits (no resize, no re-encode),
+        # so the source isn't decoded again just to find that out
+        self._originals: set = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(width: Optional[int], fmt: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+        """Map requested ?w=/?fmt= values onto the supported variants"""
+        fmt = (fmt or '').lower() or None
+        if fmt is not None and fmt not in VARIANT_FORMATS:
+            fmt = None
+        return (variant_width(width) if width else None), fmt
+
+    def get(self, asset: AssetEntry, width: Optional[int], fmt: Optional[str]) -> str:
+        """Return the path of the requested variant of asset, generating it if needed.
+
+        Falls back to the original file's path when it can't be converted (not
+        an image, or Pillow isn't installed).
+        """
+        width, fmt = self.normalize(width, fmt)
+        source = asset.path
+        if width is None and fmt is None:
+            return source
+
+        key = f'{asset.name}:{asset.digest}:{width}:{fmt}'
+        ext = VARIANT_FORMATS[fmt][1] if fmt else os.path.splitext(asset.name)[1].lstrip('.') or 'img'
+        path = os.path.join(self.cache_dir, f'{hashlib.sha1(key.encode()).hexdigest()}.{ext}')
+
+        if path in self._originals:
+            self.hits += 1
+            return source
+        if os.path.exists(path):
+            self._touch(path)
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        with self._lock_for(path):
+            if os.path.exists(path):
+                return path
+            # Resizing takes a while; under gevent it runs off the worker's hub
+            if not run_blocking(self._generate, source, path, width, fmt):
+                return source
+        self._evict()
+        return path
+
+    def warm(self, assets: Iterable[AssetEntry], widths: Iterable[int] = WARM_WIDTHS,
+             formats: Iterable[str] = WARM_FORMATS) -> int:
+        """Pregenerate variants for every asset, returning how many were created or found"""
+        count = 0
+        for asset in assets:
+            for width in widths:
+                for fmt in formats:
+                    if self.get(asset, width, fmt) != asset.path:
+                        count += 1
+        return count
+
+    def _generate(self, source: str, path: str, width: Optional[int], fmt: Optional[str]) -> bool:
+        try:
+            from PIL import Image
+        except ImportError:
+            if not self._pillow_missing:
+                logger.warning("Pillow is not installed; serving original card images")
+                self._pillow_missing = True
+            return False
+
+        try:
+            with Image.open(source) as image:
+                image_format = image.format
+                resize = bool(width) and image.width > width
+                if not resize and fmt is None:
+                    # Never upscale; the original already fits
+                    self._originals.add(path)
+                    return False
+                if resize:
+                    height = max(1, round(image.height * width / image.width))
+                    image = image.resize((width, height), Image.LANCZOS)
+                pil_format, _, options = VARIANT_FORMATS[fmt] if fmt else (image_format, None, {})
+                if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Write then rename, so other workers never see a half-written file
+                tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                try:
+                    image.save(tmp_path, format=pil_format, **options)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    # Eviction skips .tmp files, so nothing else would remove it
+                    try:
+                        os.remove(tmp_path)
+                    except FileNotFoundError:
+                        pass
+                    raise
+            return True
+        except Exception as e:
+            logger.warning(f"Could not create variant of {source}: {e}")
+            return False
+
+    def _evict(self) -> None:
+        """Delete least recently served variants until the cache fits in max_bytes"""
+        try:
+            files = [entry for entry in os.scandir(self.cache_dir)
+                     if entry.is_file() and not entry.name.endswith('.tmp')]
+        except FileNotFoundError:
+            return
+        stats = [(entry.stat(), entry.path) for entry in files]
+        total = sum(stat.st_size for stat, _ in stats)
+        if total <= self.max_bytes:
+            return
+        # _touch keeps mtime current on every hit, so oldest mtime = least recently served
+        for stat, path in sorted(stats, key=lambda item: item[0].st_mtime):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _lock_for(self, path: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+
+def main():
+    """Command-line entry point for pregenerating card variants for every media row"""
+    load_dotenv()
+    from database.sheets_manager import GoogleSheetsManager, CARDS_RANGE
+
+    try:
+        manager = GoogleSheetsManager(fast_start=False)
+        manifest = AssetManifest()
+        manifest.build()
+        assets = []
+        for row in manager.read_sheet(CARDS_RANGE):
+            asset = manifest.get(row['media_path']) if row.get('media_path') else None
+            if asset is None:
+                print(f"Skipping {row.get('id')}: no card file for {row.get('media_path')!r}")
+                continue
+            assets.append(asset)
+        print(f"Warming {len(assets)} cards at widths {WARM_WIDTHS} in {WARM_FORMATS}...")
+        count = CardVariantCache().warm(assets)
+        print(f"{count} card variants ready")
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import sys
+from typing import Any, Callable
+
+
+def gevent_patched() -> bool:
+    """Whether gevent has monkey-patched threading (gunicorn's gevent workers do)"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call func, in gevent's native thread pool when running under gevent.
+
+    Under gevent every request of a worker shares one OS thread, so a call
+    that blocks in C (flock, fsync, image resizing) would stall all of them;
+    from the thread pool it only holds up the greenlet that made it. Without
+    gevent func is simply called.
+    """
+    if not gevent_patched():
+        return func(*args, **kwargs)
+    import gevent
+    return gevent.get_hub().threadpool.apply(func, args, kwargs)
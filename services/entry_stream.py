@@ -0,0 +1,233 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .cooperative import run_blocking
+
+# Accepted entries, one JSON line each, shared by every worker on the machine
+ENTRY_EVENTS_PATH = os.getenv('ENTRY_EVENTS_PATH', os.path.join('data', 'entry_events.log'))
+ENTRY_EVENTS_MAX_BYTES = int(os.getenv('ENTRY_EVENTS_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# Stream tuning (seconds / events buffered per client / clients per worker)
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '0.5'))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+SSE_CLIENT_BUFFER = int(os.getenv('SSE_CLIENT_BUFFER', '100'))
+SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', '500'))
+SSE_RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+def _format_event(event_id: str, event: str, data: Any) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class _Subscriber:
+    __slots__ = ('queue', 'lagged')
+
+    def __init__(self):
+        self.queue: 'queue.Queue[Tuple[str, Dict[str, Any]]]' = queue.Queue(maxsize=SSE_CLIENT_BUFFER)
+        self.lagged = False
+
+
+class EntryStream:
+    """Fans accepted entries out to Server-Sent Events clients.
+
+    publish() appends the entry to a log file that every worker process tails,
+    so a client connected to one gunicorn worker also sees entries created
+    through another. The log starts with a random log id; event ids are
+    '<log id>-<offset>', which lets a reconnecting client (Last-Event-ID)
+    resume from the log, or be told to reload when the log was rotated.
+
+    Each client has a bounded buffer. A client that falls behind has its
+    buffer dropped and gets a 'reset' event (reload /api/story-view) instead
+    of holding up the others.
+    """
+
+    def __init__(self, path: str = ENTRY_EVENTS_PATH, max_bytes: int = ENTRY_EVENTS_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        self._file = None
+        self._log_missing = False  # Seen absent since the last open: it holds only new events
+        self._log_id: Optional[str] = None
+        self._offset = 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def publish(self, entry: Dict[str, Any]) -> None:
+        """Append an accepted entry to the shared event log"""
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f'{self.path}.lock', 'a') as lock:
+            # Waiting for another worker's write must not stall this one
+            run_blocking(fcntl.flock, lock, fcntl.LOCK_EX)
+            try:
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if size == 0 or size + len(line) > self.max_bytes:
+                    self._start_log()
+                with open(self.path, 'ab') as f:
+                    f.write(line)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._wake.set()
+
+    def _start_log(self) -> None:
+        """Replace the log with an empty one under a new log id (caller holds the file lock)"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write((json.dumps({'log_id': uuid.uuid4().hex[:12]}) + '\n').encode())
+        os.replace(tmp_path, self.path)
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """Yield text/event-stream chunks for one client until it disconnects"""
+        subscriber, backlog = self.subscribe(last_event_id)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            for chunk in backlog:
+                yield chunk
+            while True:
+                if subscriber.lagged:
+                    subscriber.lagged = False
+                    yield _format_event(self._current_id(), 'reset', {})
+                try:
+                    event_id, entry = subscriber.queue.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    # Comment lines keep proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format_event(event_id, 'entry', entry)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[_Subscriber, List[str]]:
+        """Register a client, returning it with the events it missed since last_event_id"""
+        self._ensure_started()
+        subscriber = _Subscriber()
+        with self._lock:
+            if len(self._subscribers) >= SSE_MAX_CLIENTS:
+                raise OverflowError('Too many stream clients')
+            # Catch up first so the backlog and live events meet without a gap
+            self._poll()
+            backlog = self._backlog(last_event_id) if last_event_id else []
+            self._subscribers.append(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _current_id(self) -> str:
+        return f'{self._log_id}-{self._offset}'
+
+    def _backlog(self, last_event_id: str) -> List[str]:
+        # Caller holds self._lock
+        reset = [_format_event(self._current_id(), 'reset', {})]
+        log_id, _, offset_text = last_event_id.rpartition('-')
+        offset = int(offset_text) if offset_text.isdecimal() else -1
+        if log_id != self._log_id or not 0 < offset <= self._offset:
+            # Rotated or unknown log: the client has to reload instead
+            return reset
+        with open(self.path, 'rb') as f:
+            f.seek(offset - 1)
+            data = f.read(self._offset - offset + 1)
+        # Event ids always point just past a line; anything else wasn't ours
+        if data[:1] != b'\n':
+            return reset
+        chunks = []
+        position = offset
+        try:
+            for line in data[1:].splitlines(keepends=True):
+                position += len(line)
+                chunks.append(_format_event(f'{self._log_id}-{position}', 'entry', json.loads(line)))
+        except ValueError:
+            return reset
+        return chunks
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._file = None
+                self._log_missing = False
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='entry-stream-tail', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(SSE_POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                with self._lock:
+                    if self._subscribers:
+                        self._poll()
+            except Exception as e:
+                logger.warning(f"Could not read entry events: {e}")
+
+    def _poll(self) -> None:
+        """Read new events from the log and hand them to every subscriber (caller holds self._lock)"""
+        if self._file is None:
+            # A log created since we found none has only events to deliver
+            if not self._open(from_start=self._log_missing):
+                self._log_missing = True
+                return
+            self._log_missing = False
+        self._deliver_new_lines()
+        try:
+            rotated = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = False
+        if rotated:
+            # Drained the old log above; new events are all in the new one
+            self._file.close()
+            if self._open(from_start=True):
+                self._deliver_new_lines()
+
+    def _open(self, from_start: bool) -> bool:
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        header = f.readline()
+        try:
+            self._log_id = json.loads(header)['log_id']
+        except (ValueError, KeyError, TypeError):
+            f.close()
+            return False
+        self._file = f
+        self._offset = f.tell() if from_start else f.seek(0, os.SEEK_END)
+        return True
+
+    def _deliver_new_lines(self) -> None:
+        self._file.seek(self._offset)
+        data = self._file.read()
+        # A line still being written has no newline yet; it is picked up next time
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines(keepends=True):
+            self._offset += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            event = (self._current_id(), entry)
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    # Slow client: drop what it hasn't read and tell it to reload
+                    subscriber.lagged = True
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
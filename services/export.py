@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, Optional
+from dotenv import load_dotenv
+
+# Rows per Sheets request when exporting straight from Sheets
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_KINDS = ('cards', 'entries')
+
+
+def ndjson_lines(kind: str, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Yield one NDJSON line per row, tagged with its type ('card' or 'entry')"""
+    record_type = 'card' if kind == 'cards' else 'entry'
+    for row in rows:
+        yield json.dumps({'type': record_type, **row}, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def export_lines(sources: Dict[str, Iterable[Dict[str, Any]]], only: Optional[str] = None) -> Iterator[str]:
+    """Chain the NDJSON lines of every card, then every entry (or just one kind)"""
+    for kind in EXPORT_KINDS:
+        if only in (None, kind):
+            yield from ndjson_lines(kind, sources[kind])
+
+
+def main():
+    """Command-line entry point for exporting every card and entry as NDJSON"""
+    parser = argparse.ArgumentParser(description='Export cards and entries as NDJSON, one per line')
+    parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+    parser.add_argument('--only', choices=EXPORT_KINDS, help='Export only cards or only entries')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                        help='Rows fetched from Sheets per request')
+    args = parser.parse_args()
+
+    load_dotenv()
+    from database.sheets_manager import GoogleSheetsManager
+
+    try:
+        manager = GoogleSheetsManager(fast_start=False)
+        # Generators all the way down: rows are fetched a chunk at a time and
+        # written as they arrive
+        sources = {
+            'cards': manager.iter_rows('media', 'A:G', args.chunk_size),
+            'entries': manager.iter_rows('entries', 'A:C', args.chunk_size),
+        }
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            count = 0
+            for line in export_lines(sources, args.only):
+                out.write(line)
+                count += 1
+        finally:
+            if args.output:
+                out.close()
+        print(f"Exported {count} records", file=sys.stderr)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
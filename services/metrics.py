@@ -0,0 +1,326 @@
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Each worker writes its metrics here; /api/metrics adds up every live worker's file
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join('data', 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '10'))
+
+# Latency histogram buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram:
+    """Distribution of observed values (cumulative buckets, sum and count) with labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[LabelValues, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def collect(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return [(key, {'buckets': list(series['buckets']), 'sum': series['sum'], 'count': series['count']})
+                    for key, series in self._values.items()]
+
+
+class Registry:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    Besides counters and histograms updated as things happen, collectors are
+    called at scrape time to report counters kept elsewhere (cache hit/miss
+    counts, scheduler state): each returns (name, kind, help, labels, value)
+    tuples.
+
+    gunicorn runs several workers and a scrape reaches only one of them, so
+    every worker writes its numbers to METRICS_DIR/<pid>.json (every
+    METRICS_FLUSH_INTERVAL seconds and on scrape) and render() adds up the
+    files of all live workers. When a worker is gone its counters and
+    histograms are added to METRICS_DIR/dead.json before its file is removed,
+    so recycling a worker never makes a total go down; its gauges are dropped.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """This process's metrics as {name: {'kind', 'help', 'buckets', 'series': [[labels, value], ...]}}"""
+        result: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            result[metric.name] = {
+                'kind': metric.kind,
+                'help': metric.help,
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'series': [[dict(zip(metric.labelnames, key)), value] for key, value in metric.collect()]
+            }
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                entry = result.setdefault(name, {'kind': kind, 'help': help_text, 'buckets': [], 'series': []})
+                entry['series'].append([{key: str(val) for key, val in labels.items()}, value])
+        return result
+
+    def start(self) -> None:
+        """Start writing this worker's metrics file periodically (once per process)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        """Write this worker's metrics file"""
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {path}: {e}")
+
+    def _all_workers(self) -> List[Dict[str, Dict[str, Any]]]:
+        live = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = os.path.basename(path)[:-len('.json')]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                self._retire(path)
+                continue
+            except PermissionError:
+                pass
+            live.append(path)
+
+        snapshots = [self.snapshot()]
+        with self._dead_lock(fcntl.LOCK_SH):
+            # Read together, so a file being folded into dead.json is counted once
+            for path in live + [os.path.join(self.directory, 'dead.json')]:
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return snapshots
+
+    @contextmanager
+    def _dead_lock(self, operation: int) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'dead.lock'), 'a') as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _retire(self, path: str) -> None:
+        """Fold a gone worker's counters into dead.json and remove its file"""
+        dead_path = os.path.join(self.directory, 'dead.json')
+        try:
+            # Scrapes of several workers may find the same file
+            with self._dead_lock(fcntl.LOCK_EX):
+                if not os.path.exists(path):
+                    return  # Another worker folded it already
+                snapshot = _read_snapshot(path) or {}
+                totals = {name: metric for name, metric in snapshot.items() if metric['kind'] != 'gauge'}
+                merged = _merge([_read_snapshot(dead_path) or {}, totals])
+                tmp_path = f'{dead_path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(_as_snapshot(merged), f, separators=(',', ':'))
+                os.replace(tmp_path, dead_path)
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not retire metrics file {path}: {e}")
+
+    def render(self) -> str:
+        """Every live worker's metrics, added up, in the Prometheus text exposition format"""
+        self.flush()
+        merged = _merge(self._all_workers())
+
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, value in sorted(metric['series'].items()):
+                if metric['kind'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'], value['buckets']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(value['sum'])}")
+                    lines.append(f"{name}_count{_labels(key)} {value['count']}")
+                else:
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots: Iterable[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Add up snapshots, giving {name: {'kind', 'help', 'buckets', 'series': {label items: value}}}"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            entry = merged.setdefault(name, {'kind': metric['kind'], 'help': metric['help'],
+                                             'buckets': metric['buckets'], 'series': {}})
+            for labels, value in metric['series']:
+                key = tuple(sorted(labels.items()))
+                if metric['kind'] == 'histogram':
+                    current = entry['series'].get(key)
+                    if current is None:
+                        entry['series'][key] = {'buckets': list(value['buckets']),
+                                                'sum': value['sum'], 'count': value['count']}
+                    else:
+                        current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                        current['sum'] += value['sum']
+                        current['count'] += value['count']
+                else:
+                    entry['series'][key] = entry['series'].get(key, 0) + value
+    return merged
+
+
+def _as_snapshot(merged: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Turn _merge() output back into the snapshot() form"""
+    return {
+        name: {'kind': metric['kind'], 'help': metric['help'], 'buckets': metric['buckets'],
+               'series': [[dict(key), value] for key, value in metric['series'].items()]}
+        for name, metric in merged.items()
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(items: Iterable[Tuple[str, str]]) -> str:
+    items = list(items)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in items) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+registry = Registry()
+
+# Updated as requests are handled; caches and queues report through collectors
+http_request_duration = registry.histogram(
+    'isee_http_request_duration_seconds', 'Time to produce an API response (headers only for streams)',
+    ['route', 'method', 'status'])
+sheets_requests = registry.counter(
+    'isee_sheets_requests_total', 'Google Sheets API calls', ['method', 'range'])
+sheets_request_errors = registry.counter(
+    'isee_sheets_request_errors_total', 'Google Sheets API calls that failed', ['method', 'range'])
+sheets_response_bytes = registry.counter(
+    'isee_sheets_response_bytes_total', 'Bytes received from the Google Sheets API', ['method', 'range'])
+sheets_request_duration = registry.histogram(
+    'isee_sheets_request_duration_seconds', 'Google Sheets API call time, including quota waits and retries',
+    ['method', 'range'])
+
+
+def cache_samples(cache: str, hits: float, misses: float, stale: Optional[float] = None):
+    """Collector samples for a cache's hit/miss (and stale hit) counts"""
+    name, help_text = 'isee_cache_requests_total', 'Cache lookups by result'
+    samples = [
+        (name, 'counter', help_text, {'cache': cache, 'result': 'hit'}, hits),
+        (name, 'counter', help_text, {'cache': cache, 'result': 'miss'}, misses),
+    ]
+    if stale is not None:
+        samples.append((name, 'counter', help_text, {'cache': cache, 'result': 'stale'}, stale))
+    return samples
@@ -0,0 +1,125 @@
+import cProfile
+import datetime
+import hmac
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from flask import Blueprint, Response, g, has_request_context, request
+
+# Fraction of API requests to profile (0 turns sampling off)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+# Sending 'X-Profile: <PROFILE_TOKEN>' profiles that request; unset disables the header
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_HEADER = 'X-Profile'
+
+# Where cProfile dumps go (open with pstats or snakeviz); only the newest are kept
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('data', 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '100'))
+
+logger = logging.getLogger(__name__)
+
+# cProfile hooks the OS thread, which every greenlet of a gevent worker
+# shares: a second profiler would replace the first (and disabling either
+# stops both), so only one request per process is profiled at a time.
+# Other requests running meanwhile still show up in its dump
+_profiling = threading.Lock()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of the current request for its Server-Timing header.
+
+    Phases may nest; each reports only the time not spent in its inner phases.
+    Outside a request this does nothing.
+    """
+    if not has_request_context() or 'phases' not in g:
+        yield
+        return
+    stack: List[List[float]] = g.phase_stack
+    frame = [0.0]  # Time spent in nested phases
+    stack.append(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+        g.phases[name] = g.phases.get(name, 0.0) + elapsed - frame[0]
+
+
+def _should_profile() -> bool:
+    header = request.headers.get(PROFILE_HEADER)
+    if header and PROFILE_TOKEN and hmac.compare_digest(header, PROFILE_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _dump(profiler: cProfile.Profile) -> Optional[str]:
+    route = request.url_rule.rule if request.url_rule else request.path
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    filename = f'{stamp}-{slug}-{os.getpid()}.prof'
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+        _prune()
+    except OSError as e:
+        logger.warning(f"Could not write profile {filename}: {e}")
+        return None
+    return filename
+
+
+def _prune() -> None:
+    """Delete the oldest dumps beyond PROFILE_MAX_FILES"""
+    # Names start with a timestamp, so they sort oldest first
+    dumps = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.prof'))
+    for name in dumps[:max(0, len(dumps) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def install(blueprint: Blueprint) -> None:
+    """Add Server-Timing phases and sampled cProfile dumps to every route of blueprint"""
+
+    @blueprint.before_request
+    def start_profiling():
+        g.phases = {}
+        g.phase_stack = []
+        g.phase_started = time.perf_counter()
+        if _should_profile() and _profiling.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @blueprint.after_request
+    def finish_profiling(response: Response) -> Response:
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            filename = _dump(profiler)
+            if filename:
+                response.headers['X-Profile-Id'] = filename
+        phases = g.pop('phases', None)
+        started = g.pop('phase_started', None)
+        if phases is not None and started is not None:
+            timings = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in phases.items()]
+            timings.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    @blueprint.teardown_request
+    def abandon_profiling(exc: Optional[BaseException]) -> None:
+        # after_request doesn't run when a view raises
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+# Rows read per request while walking a sheet
+MAINTENANCE_WINDOW_SIZE = 1000
+
+# Limits of one batchUpdate: cells written and (approximate) request body size
+MAINTENANCE_BATCH_CELLS = 500
+MAINTENANCE_BATCH_BYTES = 512 * 1024
+
+# Progress of interrupted runs, one file per task and sheet
+MAINTENANCE_CHECKPOINT_DIR = os.path.join('data', 'maintenance')
+
+
+class Fix(NamedTuple):
+    """One cell to rewrite"""
+    row: int
+    column: int
+    old: Any
+    new: Any
+
+
+def iter_sheet_rows(manager, sheet_name: str, headers: List[str], start_row: int = 2,
+                    window_size: int = MAINTENANCE_WINDOW_SIZE) -> Iterator[Tuple[int, List[Any]]]:
+    """Yield (row number, cells) for a sheet's rows, window_size rows per request.
+
+    Every column with a header is read, so a row only counts as blank when it
+    has no data at all; more than window_size of those in a row end the walk.
+    """
+    from database.sheets_manager import column_letter
+    return manager.iter_rows(sheet_name, f'A:{column_letter(len(headers) - 1)}', window_size, start_row, raw=True)
+
+
+def read_headers(manager, sheet_name: str) -> List[str]:
+    header_range = f'{sheet_name}!1:1'
+    values = manager.read_values([header_range])[header_range]
+    return values[0] if values else []
+
+
+def missing_id_fixes(rows: Iterable[Tuple[int, List[Any]]], id_column: int,
+                     generate_id: Callable[[], str]) -> Iterator[Fix]:
+    """Give every non-empty row without an id a new one"""
+    for row_number, row in rows:
+        # Entirely empty rows are left alone
+        if not any(cell != '' for cell in row):
+            continue
+        if len(row) <= id_column or not row[id_column]:
+            yield Fix(row_number, id_column, '', generate_id())
+
+
+def normalize_media_path(path: str) -> str:
+    """Just the filename, lowercase, with underscores for spaces"""
+    return os.path.basename(path).replace(' ', '_').lower()
+
+
+def media_path_fixes(rows: Iterable[Tuple[int, List[Any]]], path_column: int) -> Iterator[Fix]:
+    """Normalize every media path"""
+    for row_number, row in rows:
+        if len(row) <= path_column or row[path_column] == '':
+            continue
+        clean = normalize_media_path(row[path_column])
+        if clean != row[path_column]:
+            yield Fix(row_number, path_column, row[path_column], clean)
+
+
+def batch_fixes(fixes: Iterable[Fix], sheet_name: str, max_cells: int = MAINTENANCE_BATCH_CELLS,
+                max_bytes: int = MAINTENANCE_BATCH_BYTES) -> Iterator[Tuple[List[Dict[str, Any]], int]]:
+    """Group fixes into batchUpdate data lists of at most max_cells cells and about max_bytes.
+
+    Yields (data, last_row): every fix up to last_row is in this batch or an
+    earlier one.
+    """
+    from database.sheets_manager import column_letter
+    batch: List[Dict[str, Any]] = []
+    size = 0
+    last_row = 0
+    for fix in fixes:
+        update = {'range': f'{sheet_name}!{column_letter(fix.column)}{fix.row}', 'values': [[fix.new]]}
+        update_size = len(json.dumps(update))
+        if batch and (len(batch) >= max_cells or size + update_size > max_bytes):
+            yield batch, last_row
+            batch, size = [], 0
+        batch.append(update)
+        size += update_size
+        last_row = fix.row
+    if batch:
+        yield batch, last_row
+
+
+def format_fix(sheet_name: str, fix: Fix) -> str:
+    """The change as a pair of diff lines"""
+    from database.sheets_manager import column_letter
+    cell = f'{sheet_name}!{column_letter(fix.column)}{fix.row}'
+    return f'- {cell} {json.dumps(fix.old, ensure_ascii=False)}\n+ {cell} {json.dumps(fix.new, ensure_ascii=False)}'
+
+
+class Checkpoint:
+    """The row a task has been applied through, kept in a JSON file so a failed run can resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[int]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return int(json.load(f)['done_through_row'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}", file=sys.stderr)
+            return None
+
+    def save(self, row: int) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'done_through_row': row}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def plan_fixes(manager, task: str, sheet_name: str, start_row: int = 2,
+               window_size: int = MAINTENANCE_WINDOW_SIZE) -> Iterator[Fix]:
+    """The fixes task ('ids' or 'paths') would make to sheet_name, from start_row down"""
+    headers = read_headers(manager, sheet_name)
+    if not headers:
+        return iter(())
+    if task == 'ids':
+        # The first column is the id column if none is named 'id'
+        id_column = headers.index('id') if 'id' in headers else 0
+        rows = iter_sheet_rows(manager, sheet_name, headers, start_row, window_size)
+        return missing_id_fixes(rows, id_column, manager.generate_id)
+    if task == 'paths':
+        if 'media_path' not in headers:
+            raise ValueError(f"Sheet {sheet_name} has no media_path column")
+        path_column = headers.index('media_path')
+        rows = iter_sheet_rows(manager, sheet_name, headers, start_row, window_size)
+        return media_path_fixes(rows, path_column)
+    raise ValueError(f"Unknown task: {task}")
+
+
+def run(manager, task: str, sheet_name: str, dry_run: bool = False, checkpoint: Optional[Checkpoint] = None,
+        window_size: int = MAINTENANCE_WINDOW_SIZE, max_cells: int = MAINTENANCE_BATCH_CELLS,
+        max_bytes: int = MAINTENANCE_BATCH_BYTES, out=sys.stdout) -> int:
+    """Apply (or with dry_run, print) task's fixes a window and a batch at a time, returning how many.
+
+    After each batch is written the checkpoint records how far the run got,
+    so a run that fails part way resumes from there; it is removed once the
+    whole sheet is done.
+    """
+    start_row = 2
+    if checkpoint is not None and not dry_run:
+        done = checkpoint.load()
+        if done is not None:
+            start_row = done + 1
+            print(f"Resuming {task} on {sheet_name} from row {start_row}", file=sys.stderr)
+
+    fixes = plan_fixes(manager, task, sheet_name, start_row, window_size)
+    count = 0
+    if dry_run:
+        for fix in fixes:
+            print(format_fix(sheet_name, fix), file=out)
+            count += 1
+        return count
+
+    for data, last_row in batch_fixes(fixes, sheet_name, max_cells, max_bytes):
+        manager.batch_update(data)
+        count += len(data)
+        if checkpoint is not None:
+            checkpoint.save(last_row)
+        print(f"Updated {count} cells (through row {last_row})", file=sys.stderr)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return count
+
+
+def main():
+    """Command-line entry point for sheet maintenance (missing ids, media paths)"""
+    parser = argparse.ArgumentParser(description='Fix up a sheet a window of rows at a time')
+    parser.add_argument('task', choices=['ids', 'paths'],
+                        help='ids: give rows without an id a new one; paths: normalize media_path filenames')
+    parser.add_argument('--sheet', default='media', help='Sheet to walk (default: media)')
+    parser.add_argument('--dry-run', action='store_true', help='Print the changes as a diff instead of writing them')
+    parser.add_argument('--window', type=int, default=MAINTENANCE_WINDOW_SIZE, help='Rows read per request')
+    parser.add_argument('--batch-cells', type=int, default=MAINTENANCE_BATCH_CELLS,
+                        help='Most cells written per batchUpdate')
+    parser.add_argument('--batch-bytes', type=int, default=MAINTENANCE_BATCH_BYTES,
+                        help='Approximate largest batchUpdate body')
+    parser.add_argument('--checkpoint', help='Progress file (default: data/maintenance/<task>-<sheet>.json)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+    args = parser.parse_args()
+
+    load_dotenv()
+    from database.sheets_manager import GoogleSheetsManager
+
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(MAINTENANCE_CHECKPOINT_DIR,
+                                                            f'{args.task}-{args.sheet}.json'))
+    if args.restart:
+        checkpoint.clear()
+    try:
+        manager = GoogleSheetsManager(fast_start=False)
+        count = run(manager, args.task, args.sheet, args.dry_run, checkpoint,
+                    args.window, args.batch_cells, args.batch_bytes)
+        verb = 'Would update' if args.dry_run else 'Updated'
+        print(f"{verb} {count} cells in {args.sheet}", file=sys.stderr)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}", file=sys.stderr)
+        if not args.dry_run:
+            print(f"Progress is saved in {checkpoint.path}; run again to resume", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()